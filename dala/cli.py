@@ -2,13 +2,12 @@ import argparse
 import sys
 import os
 import asyncio
-import aiohttp
-import socket
+import hashlib
 import time
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 from inspect import isawaitable
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from tqdm.asyncio import tqdm_asyncio
 from ebooklib import epub
 from dotenv import load_dotenv
@@ -16,12 +15,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from dala.models import (
-    log, Source, ConversionOptions, BookData, ConversionContext, 
-    GLOBAL_SEMAPHORE, REQUEST_TIMEOUT, normalize_image_preset, sanitize_filename, parse_page_spec
+    log, Source, ConversionOptions, BookData, ConversionContext, ImageAsset,
+    GLOBAL_SEMAPHORE, normalize_image_preset, sanitize_filename, parse_page_spec
 )
 from dala.core.profiles import ProfileManager
 from dala.core.dispatcher import DriverDispatcher
-from dala.core.session import get_session, load_cookie_file
+from dala.core.session import get_session, load_cookie_file, session_with_cookies
 from dala.core.writer import OutputWriteError, default_output_filename, ensure_output_extension, write_output_book
 from dala.core.browser import BrowserChallengeError, BrowserFetchError, BrowserFetchOptions, fetch_rendered_source, validate_browser_options
 from dala.core.image_budget import ImageBudgetExceeded, assert_image_budget, prepare_books_for_bundle
@@ -79,13 +78,10 @@ async def process_urls(
             driver = DriverDispatcher.get_driver(source, profile)
 
             local_session = session
+            if getattr(session, "closed", False):
+                log.warning(f"Shared HTTP session is closed before processing {source.url}.")
             if source.cookies:
-                connector = aiohttp.TCPConnector(
-                    resolver=aiohttp.resolver.ThreadedResolver(),
-                    ttl_dns_cache=300,
-                    family=socket.AF_INET
-                )
-                local_session = aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, cookies=source.cookies, connector=connector)
+                local_session = session_with_cookies(session, source.cookies)
                 setattr(local_session, "_extra_cookies", source.cookies)
 
             try:
@@ -143,7 +139,7 @@ async def process_urls(
 def create_bundle(books: List[BookData], title: str, author: str) -> BookData:
     master_uid = f"urn:bundle:{abs(hash(title))}"
     master_chapters = []
-    master_images = []
+    master_images: Dict[Tuple[str, str], ImageAsset] = {}
     master_toc = []
     prepared_books, image_stats = prepare_books_for_bundle(books)
     if image_stats.duplicate_count or image_stats.remapped_count:
@@ -154,13 +150,15 @@ def create_bundle(books: List[BookData], title: str, author: str) -> BookData:
 
     for book in prepared_books:
         for img in book.images:
-            if img not in master_images: master_images.append(img)
+            master_images.setdefault((img.uid, img.filename), img)
 
         article_chap = None
         comments_chap = None
 
+        # Stable across runs (unlike hash(), which PYTHONHASHSEED randomizes).
+        prefix = hashlib.blake2b(book.source_url.encode("utf-8"), digest_size=6).hexdigest()
         for chap in book.chapters:
-            chap.filename = f"doc_{abs(hash(book.source_url))}_{chap.filename}"
+            chap.filename = f"doc_{prefix}_{chap.filename}"
             master_chapters.append(chap)
             if chap.is_article: article_chap = chap
             elif chap.is_comments: comments_chap = chap
@@ -179,7 +177,7 @@ def create_bundle(books: List[BookData], title: str, author: str) -> BookData:
             else:
                 master_toc.append(epub.Link(article_chap.filename, toc_title, article_chap.uid))
 
-    return BookData(title=title, author=author, uid=master_uid, language="en", description=f"Bundle of {len(books)} articles.", source_url="", chapters=master_chapters, images=master_images, toc_structure=master_toc)
+    return BookData(title=title, author=author, uid=master_uid, language="en", description=f"Bundle of {len(books)} articles.", source_url="", chapters=master_chapters, images=list(master_images.values()), toc_structure=master_toc)
 
 
 def bundle_filename_title(title: str, options: ConversionOptions) -> str:
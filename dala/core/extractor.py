@@ -10,7 +10,7 @@ from urllib.parse import urlparse, quote
 from typing import Optional
 from yarl import URL
 
-from ..models import log, ARCHIVE_ORG_API_BASE, SiteProfile
+from ..models import log, ARCHIVE_ORG_API_BASE, HTML_PARSER, SiteProfile
 from .browser import DEFAULT_BROWSER_PROFILE_DIR, BrowserChallengeError, BrowserFetchError, BrowserFetchOptions, detect_browser_challenge, fetch_rendered_source, resolve_browser_extension_path
 from .session import fetch_with_retry
 
@@ -236,7 +236,7 @@ class ArticleExtractor:
     def extract_from_html(html_content, url, profile: Optional[SiteProfile] = None):
         try:
             metadata = trafilatura.extract_metadata(html_content)
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = BeautifulSoup(html_content, HTML_PARSER)
             author = ArticleExtractor._best_author(metadata.author if metadata else None, soup)
             
             # Use profile-specific remove selectors if provided
@@ -270,7 +270,7 @@ class ArticleExtractor:
                     truncated_html = None
                     if content_soup:
                          ArticleExtractor._clean_soup(content_soup)
-                         truncated_html = content_soup.prettify()
+                         truncated_html = str(content_soup)
                     return {
                         'success': False, 
                         'html': truncated_html, 
@@ -285,7 +285,7 @@ class ArticleExtractor:
             extracted_html = None
             if content_soup:
                 ArticleExtractor._clean_soup(content_soup)
-                extracted_html = content_soup.prettify()
+                extracted_html = str(content_soup)
             else:
                 log.info("Selectors failed, falling back to Trafilatura extraction.")
                 extracted_html = trafilatura.extract(html_content, include_images=True, include_tables=True, output_format='html')
@@ -295,11 +295,11 @@ class ArticleExtractor:
                 if best_fallback and len(best_fallback.get_text()) > 100:
                      log.warning("Extraction returned empty. Using best readable container fallback.")
                      ArticleExtractor._clean_soup(best_fallback)
-                     extracted_html = best_fallback.prettify()
+                     extracted_html = str(best_fallback)
                 elif soup.body and len(soup.body.get_text()) > 100:
                      log.warning("Extraction returned empty. Using full body as fallback.")
                      ArticleExtractor._clean_soup(soup.body)
-                     extracted_html = soup.body.prettify()
+                     extracted_html = str(soup.body)
                 else:
                     raise ValueError("Content too short")
 
@@ -6,10 +6,11 @@ import re
 
 import aiohttp
 from bs4 import BeautifulSoup, Tag
+from lxml import html as lxml_html
 from tqdm.asyncio import tqdm_asyncio
 from yarl import URL
 from urllib.parse import urljoin, urlparse
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
 
 from ..models import (
     IMAGE_DIR_IN_EPUB, IMAGE_TIMEOUT, IMG_MAX_PER_IMAGE_SEC,
@@ -19,7 +20,95 @@ from .image_processor import (
     BaseImageProcessor, ImageProcessor, FORUM_IMAGE_CONCURRENCY, FORUM_REQUESTS_TIMEOUT,
 )
 
+_VIEWER_IMAGE_HREF_RE = re.compile(r'\.(jpg|jpeg|png|webp|gif)(\?|$)', re.IGNORECASE)
+_IMAGE_URL_RE = re.compile(r'\.(jpe?g|png|webp|gif|bmp)(\?|$)', re.IGNORECASE)
+_ATTACHMENT_VIEWER_RE = re.compile(r'/attachments/[^/]+\.\d+/?')
+
+
+class AssetStore:
+    """Indexed view over a book's image assets.
+
+    Wraps the caller's list in place (appends stay visible through ``.list``)
+    and keeps filename, normalized-URL and content-hash lookups O(1).
+    """
+
+    def __init__(self, assets: Optional[List[ImageAsset]] = None):
+        self._assets: List[ImageAsset] = assets if assets is not None else []
+        self.by_filename: Set[str] = set()
+        self.by_normalized_url: Dict[str, ImageAsset] = {}
+        self.by_content_hash: Dict[str, ImageAsset] = {}
+        for asset in self._assets:
+            self._index(asset)
+
+    @staticmethod
+    def hash_content(data: Optional[bytes]) -> Optional[str]:
+        if not data:
+            return None
+        try:
+            return hashlib.sha1(data).hexdigest()
+        except Exception:
+            return None
+
+    @property
+    def list(self) -> List[ImageAsset]:
+        return self._assets
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def __iter__(self) -> Iterator[ImageAsset]:
+        return iter(self._assets)
+
+    def _index(self, asset: ImageAsset, content_hash: Optional[str] = None) -> None:
+        self.by_filename.add(asset.filename)
+        for url in [asset.original_url, *(asset.alt_urls or [])]:
+            if not isinstance(url, str):
+                continue
+            norm = normalize_url_for_matching(url)
+            if norm:
+                # First asset wins, matching the previous in-order list scan.
+                self.by_normalized_url.setdefault(norm, asset)
+        hashed = content_hash or self.hash_content(asset.content)
+        if hashed:
+            self.by_content_hash[hashed] = asset
+
+    def add(self, asset: ImageAsset, content_hash: Optional[str] = None) -> None:
+        self._assets.append(asset)
+        self._index(asset, content_hash)
+
+    @staticmethod
+    def uid_for(filename: str) -> str:
+        """Return the manifest uid for an image stored under ``filename``.
+
+        Derived from the final filename, like ``ImageProcessor`` does, so it
+        is unique whenever the filename is and stable across runs.
+        """
+        return f"img_{ImageProcessor._short_stable_hash(filename)}"
+
+    def filename_taken(self, filename: str) -> bool:
+        return filename in self.by_filename
+
+    def find_by_url(self, url: Optional[str]) -> Optional[ImageAsset]:
+        norm = normalize_url_for_matching(url) if url else ""
+        return self.by_normalized_url.get(norm) if norm else None
+
+    def find_by_hash(self, content_hash: Optional[str]) -> Optional[ImageAsset]:
+        return self.by_content_hash.get(content_hash) if content_hash else None
+
+
 class ForumImageProcessor:
+    STRIPPED_IMAGE_ATTRS = frozenset({
+        'srcset', 'data-src', 'data-srcset', 'data-url', 'data-lazy',
+        'loading', 'decoding', 'style', 'class', 'width', 'height',
+        'data-zoom-target', 'title', 'data-lb-id', 'data-lb-src',
+        'data-lb-single-image', 'data-lb-container-zoom', 'data-lb-trigger',
+        'data-xf-init',
+    })
+    CANDIDATE_IMAGE_SELECTOR = (
+        'img[src], img[data-src], img[data-lazy], img[data-url], '
+        'img[srcset], img[data-srcset], a[href] img'
+    )
+
     @staticmethod
     def _per_image_timeout_seconds() -> float:
         # Preserve the legacy patch point used by tests and external callers.
@@ -33,16 +122,8 @@ class ForumImageProcessor:
     @staticmethod
     def _strip_forum_img_attrs(img_tag: Tag) -> None:
         """Remove forum/lightbox-specific attributes before styling the image."""
-        attrs_to_remove = [
-            'srcset', 'data-src', 'data-srcset', 'data-url', 'data-lazy',
-            'loading', 'decoding', 'style', 'class', 'width', 'height',
-            'data-zoom-target', 'title', 'data-lb-id', 'data-lb-src',
-            'data-lb-single-image', 'data-lb-container-zoom', 'data-lb-trigger',
-            'data-xf-init'
-        ]
-        for attr in attrs_to_remove:
-            if img_tag.has_attr(attr):
-                del img_tag[attr]
+        stripped = ForumImageProcessor.STRIPPED_IMAGE_ATTRS
+        img_tag.attrs = {k: v for k, v in img_tag.attrs.items() if k not in stripped}
 
     @staticmethod
     def _cleanup_lightbox_wrappers(img_tag: Tag) -> None:
@@ -172,16 +253,29 @@ class ForumImageProcessor:
             unique.append(key)
         return unique
 
+    @staticmethod
+    def _alt_urls(*urls: Optional[str]) -> List[str]:
+        """Each usable URL plus its query-less form, deduplicated in order."""
+        def _variants():
+            for u in urls:
+                if u and isinstance(u, str):
+                    yield u
+                    if "?" in u:
+                        yield u.split("?", 1)[0]
+        return list(dict.fromkeys(_variants()))
+
     @staticmethod
     def _parse_viewer_for_image(html_bytes, base_url):
+        # Viewer pages are only scanned for one URL, so skip building a bs4 tree.
         try:
-            soup = BeautifulSoup(html_bytes, 'html.parser')
-            img = soup.find('img')
-            if img and img.get('src'):
+            doc = lxml_html.fromstring(html_bytes)
+            img = next(doc.iter('img'), None)
+            if img is not None and img.get('src'):
                 return urljoin(base_url, img.get('src'))
-            link = soup.find('a', href=re.compile(r'\.(jpg|jpeg|png|webp|gif)(\?|$)', re.IGNORECASE))
-            if link and link.get('href'):
-                return urljoin(base_url, link.get('href'))
+            for link in doc.iter('a'):
+                href = link.get('href')
+                if href and _VIEWER_IMAGE_HREF_RE.search(href):
+                    return urljoin(base_url, href)
         except Exception:
             return None
         return None
@@ -240,18 +334,10 @@ class ForumImageProcessor:
             return None, None, str(e)
 
     @staticmethod
-    async def process_images(session, soup, base_url, book_assets: list, preloaded_assets: Optional[List[Dict[str, Any]]] = None, options: Optional[ConversionOptions] = None):
+    async def process_images(session, soup, base_url, book_assets: Union[list, AssetStore], preloaded_assets: Optional[List[Dict[str, Any]]] = None, options: Optional[ConversionOptions] = None):
         preloaded_assets = preloaded_assets or []
         preload_map: Dict[str, ImageAsset] = {}
-        hash_map: Dict[str, ImageAsset] = {}
-
-        def _hash_bytes(data: bytes) -> Optional[str]:
-            if not data:
-                return None
-            try:
-                return hashlib.sha1(data).hexdigest()
-            except Exception:
-                return None
+        store = book_assets if isinstance(book_assets, AssetStore) else AssetStore(book_assets)
 
         def add_to_map(url_val: str, asset_obj: Optional[ImageAsset]):
             if not asset_obj or not url_val:
@@ -276,7 +362,7 @@ class ForumImageProcessor:
             except Exception:
                 pass
 
-        for asset in book_assets:
+        for asset in store:
             urls = set()
             if asset.original_url and isinstance(asset.original_url, str):
                 urls.add(asset.original_url)
@@ -286,36 +372,51 @@ class ForumImageProcessor:
                         urls.add(u)
             for u in urls:
                 add_to_map(u, asset)
-            h = _hash_bytes(asset.content)
-            if h:
-                hash_map[h] = asset
 
-        for a in preloaded_assets:
-            hint_urls = [a.get("original_url"), a.get("viewer_url"), a.get("canonical_url"), a.get("url"), a.get("src")]
-            hint_urls = [u for u in hint_urls if u and isinstance(u, str)]
-            for h in hint_urls:
-                add_to_map(h, preload_map.get(h) or preload_map.get(normalize_url_for_matching(h)))
+        # Hints only alias URLs onto assets that are already mapped, so there is
+        # nothing to seed on a first pass without prior assets.
+        if preload_map:
+            for a in preloaded_assets:
+                hint_urls = [a.get("original_url"), a.get("viewer_url"), a.get("canonical_url"), a.get("url"), a.get("src")]
+                for h in hint_urls:
+                    if not h or not isinstance(h, str):
+                        continue
+                    asset_obj = preload_map.get(h)
+                    if asset_obj is None:
+                        asset_obj = preload_map.get(normalize_url_for_matching(h))
+                    if asset_obj:
+                        add_to_map(h, asset_obj)
 
         if preload_map:
             sample_keys = list(preload_map.keys())[:5]
             log.debug(f"Forum preload map size={len(preload_map)} sample={sample_keys}")
 
-        for pic in soup.find_all('picture'):
-            img = pic.find('img')
-            if img:
-                for source in pic.find_all('source'):
-                    source.decompose()
-                pic.replace_with(img)
+        for node in soup.select('picture, iframe'):
+            if node.decomposed:
+                continue
+            if node.name == 'picture':
+                img = node.find('img')
+                if img:
+                    for source in node.find_all('source'):
+                        source.decompose()
+                    node.replace_with(img)
+                else:
+                    node.decompose()
             else:
-                pic.decompose()
-
-        for media in soup.find_all(['iframe']):
-            href = media.get('src') or media.get('data-src')
-            link = soup.new_tag('a', href=href or '#')
-            link.string = href or "Embedded media"
-            media.replace_with(link)
-
-        img_tags = soup.find_all('img')
+                href = node.get('src') or node.get('data-src')
+                link = soup.new_tag('a', href=href or '#')
+                link.string = href or "Embedded media"
+                node.replace_with(link)
+
+        # Images with no source attribute and no enclosing link can never
+        # resolve to a URL, so don't schedule tasks for them.
+        img_tags = soup.select(ForumImageProcessor.CANDIDATE_IMAGE_SELECTOR)
+        # Resolve each image's nearest enclosing <a> in one pass up front instead
+        # of walking ancestors per image; inner anchors overwrite outer ones.
+        link_parent_map: Dict[int, Tag] = {}
+        for anchor in soup.find_all('a'):
+            for nested_img in anchor.find_all('img'):
+                link_parent_map[id(nested_img)] = anchor
         tasks = []
         image_sem = asyncio.Semaphore(max(1, FORUM_IMAGE_CONCURRENCY))
         max_dim, quality, color_mode, output_pref = ImageProcessor.image_optimize_params(options)
@@ -334,7 +435,7 @@ class ForumImageProcessor:
             log.info(
                 "Forum image pass start: "
                 f"images={len(img_tags)} preloaded_assets={len(preloaded_assets)} "
-                f"existing_assets={len(book_assets)} base={base_url}"
+                f"existing_assets={len(store)} base={base_url}"
             )
 
         async def _process_tag(img_tag):
@@ -345,7 +446,7 @@ class ForumImageProcessor:
             data_lazy = img_tag.get('data-lazy')
             data_srcset = img_tag.get('data-srcset')
             link_href = None
-            parent_link = img_tag.find_parent('a')
+            parent_link = link_parent_map.get(id(img_tag))
             if parent_link and parent_link.get('href'):
                 link_href = parent_link.get('href')
 
@@ -391,7 +492,7 @@ class ForumImageProcessor:
                     stats["dropped"] += 1
                     return
 
-                if not re.search(r'\.(jpe?g|png|webp|gif|bmp)(\?|$)', full_url, re.IGNORECASE) and "attachments" not in full_url and "image" not in full_url:
+                if not _IMAGE_URL_RE.search(full_url) and "attachments" not in full_url and "image" not in full_url:
                     return
 
                 viewer_url = None
@@ -399,7 +500,7 @@ class ForumImageProcessor:
                 if "/attachments/" in full_url:
                     attachment_base = full_url.split("?", 1)[0]
 
-                if link_href and re.search(r'/attachments/[^/]+\.\d+/?', link_href):
+                if link_href and _ATTACHMENT_VIEWER_RE.search(link_href):
                     viewer_url = urljoin(base_url, link_href.strip())
                 elif attachment_base:
                     viewer_url = attachment_base
@@ -433,23 +534,10 @@ class ForumImageProcessor:
                 else:
                     log.debug(f"Forum no preload match for {full_url[:100]}")
 
-                def _url_same(lhs, rhs):
-                    norm_l = ForumImageProcessor._normalize_for_match(lhs)
-                    norm_r = ForumImageProcessor._normalize_for_match(rhs)
-                    return norm_l and norm_r and norm_l == norm_r
-
-                def _matches_asset(a):
-                    candidates = [full_url, viewer_url, attachment_base]
-                    asset_urls = [a.original_url]
-                    if getattr(a, "alt_urls", None):
-                        asset_urls.extend([u for u in a.alt_urls if u])
-                    for cand in candidates:
-                        for au in asset_urls:
-                            if _url_same(cand, au):
-                                return True
-                    return False
-
-                existing = next((a for a in book_assets if _matches_asset(a)), None)
+                existing = next(
+                    (a for a in map(store.find_by_url, (full_url, viewer_url, attachment_base)) if a),
+                    None,
+                )
                 if existing:
                     img_tag['src'] = existing.filename
                     caption_text = ImageProcessor.find_caption(img_tag)
@@ -489,9 +577,9 @@ class ForumImageProcessor:
                         except Exception:
                             data_bytes = None
                     if data_bytes:
-                        hashed = _hash_bytes(data_bytes)
-                        if hashed and hashed in hash_map:
-                            asset = hash_map[hashed]
+                        hashed = AssetStore.hash_content(data_bytes)
+                        asset = store.find_by_hash(hashed)
+                        if asset:
                             img_tag['src'] = asset.filename
                             caption_text = ImageProcessor.find_caption(img_tag)
                             ForumImageProcessor._finalize_image_tag(soup, img_tag, caption_text)
@@ -499,23 +587,15 @@ class ForumImageProcessor:
                         fname_base = sanitize_filename(os.path.splitext(os.path.basename(urlparse(full_url).path))[0])
                         ext = os.path.splitext(fname_base)[1] or ".img"
                         if len(fname_base) < 3:
-                            fname_base = f"img_{abs(hash(full_url))}"
+                            fname_base = f"img_{ImageProcessor._short_stable_hash(full_url)}"
                         count = 0
                         fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}{ext}"
-                        while any(a.filename == fname for a in book_assets):
+                        while store.filename_taken(fname):
                             count += 1
                             fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}_{count}{ext}"
-                        uid = f"img_{abs(hash(fname))}"
-                        alt_urls = []
-                        for u in [orig, view, canonical, extra, full_url, attachment_base, viewer_url]:
-                            if u and isinstance(u, str):
-                                alt_urls.append(u)
-                                if "?" in u:
-                                    alt_urls.append(u.split("?",1)[0])
-                        asset = ImageAsset(uid=uid, filename=fname, media_type=mime, content=data_bytes, original_url=full_url, alt_urls=list(dict.fromkeys([u for u in alt_urls if u])))
-                        book_assets.append(asset)
-                        if hashed:
-                            hash_map[hashed] = asset
+                        alt_urls = ForumImageProcessor._alt_urls(orig, view, canonical, extra, full_url, attachment_base, viewer_url)
+                        asset = ImageAsset(uid=AssetStore.uid_for(fname), filename=fname, media_type=mime, content=data_bytes, original_url=full_url, alt_urls=alt_urls)
+                        store.add(asset, hashed)
                         for u in asset.alt_urls or []:
                             add_to_map(u, asset)
                         img_tag['src'] = fname
@@ -539,39 +619,28 @@ class ForumImageProcessor:
                     log.debug(f"Skipped image {full_url}: {val_err}")
                     return
 
-                hashed = _hash_bytes(final_data)
-                if hashed and hashed in hash_map:
-                    asset = hash_map[hashed]
+                hashed = AssetStore.hash_content(final_data)
+                asset = store.find_by_hash(hashed)
+                if asset:
                     img_tag['src'] = asset.filename
                     caption_text = ImageProcessor.find_caption(img_tag)
                     ForumImageProcessor._finalize_image_tag(soup, img_tag, caption_text)
                     return
 
-                alt_urls = [full_url]
-                if "?" in full_url:
-                    alt_urls.append(full_url.split("?", 1)[0])
-                if viewer_url:
-                    alt_urls.append(viewer_url)
-                    if "?" in viewer_url:
-                        alt_urls.append(viewer_url.split("?", 1)[0])
-                if attachment_base:
-                    alt_urls.append(attachment_base)
+                alt_urls = ForumImageProcessor._alt_urls(full_url, viewer_url, attachment_base)
 
                 fname_base = sanitize_filename(os.path.splitext(os.path.basename(urlparse(full_url).path))[0])
                 if len(fname_base) < 3:
-                    fname_base = f"img_{abs(hash(full_url))}"
+                    fname_base = f"img_{ImageProcessor._short_stable_hash(full_url)}"
 
                 count = 0
                 fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}{ext}"
-                while any(a.filename == fname for a in book_assets):
+                while store.filename_taken(fname):
                     count += 1
                     fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}_{count}{ext}"
 
-                uid = f"img_{abs(hash(fname))}"
-                asset = ImageAsset(uid=uid, filename=fname, media_type=mime, content=final_data, original_url=full_url, alt_urls=list(dict.fromkeys([u for u in alt_urls if u])))
-                book_assets.append(asset)
-                if hashed:
-                    hash_map[hashed] = asset
+                asset = ImageAsset(uid=AssetStore.uid_for(fname), filename=fname, media_type=mime, content=final_data, original_url=full_url, alt_urls=alt_urls)
+                store.add(asset, hashed)
                 for u in asset.alt_urls or []:
                     add_to_map(u, asset)
 
@@ -607,5 +676,5 @@ class ForumImageProcessor:
                 f"images={len(img_tags)} matched={stats['matched']} existing={stats['existing']} "
                 f"preloaded={stats['preloaded']} fetched={stats['fetched']} dropped={stats['dropped']} "
                 f"timed_out={stats['timed_out']} errors={stats['errors']} "
-                f"duration_ms={duration_ms} assets={len(book_assets)}"
+                f"duration_ms={duration_ms} assets={len(store)}"
             )
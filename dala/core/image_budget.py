@@ -129,6 +129,23 @@ def _unique_filename(existing: set, original: str, book_index: int) -> str:
     return candidate
 
 
+def _unique_uid(existing: set, asset: ImageAsset) -> str:
+    """Keep the asset's uid unless another bundled book already uses it.
+
+    Per-book uids (forum ``img_<hash>`` ids, driver counters) can repeat
+    across books, and the bundle's OPF manifest needs them unique. A
+    clashing uid is re-derived from the asset's bundle-unique filename.
+    """
+    if asset.uid not in existing:
+        return asset.uid
+    candidate = f"img_{hashlib.sha1(asset.filename.encode('utf-8')).hexdigest()[:10]}"
+    counter = 1
+    while candidate in existing:
+        counter += 1
+        candidate = f"img_{hashlib.sha1(f'{asset.filename}#{counter}'.encode('utf-8')).hexdigest()[:10]}"
+    return candidate
+
+
 def _remap_chapter_images(chapter: Chapter, filename_map: Dict[str, str]) -> Chapter:
     if not filename_map:
         return chapter
@@ -157,6 +174,7 @@ def _remap_chapter_images(chapter: Chapter, filename_map: Dict[str, str]) -> Cha
 def prepare_books_for_bundle(books: List[BookData]) -> Tuple[List[BookData], ImageStats]:
     prepared = []
     seen_filenames = set()
+    seen_uids = set()
     seen_hashes: Dict[str, ImageAsset] = {}
     seen_urls: Dict[str, ImageAsset] = {}
     stats = ImageStats()
@@ -184,6 +202,8 @@ def prepare_books_for_bundle(books: List[BookData]) -> Tuple[List[BookData], Ima
                 new_asset.filename = new_filename
                 stats.remapped_count += 1
             seen_filenames.add(new_asset.filename)
+            new_asset.uid = _unique_uid(seen_uids, new_asset)
+            seen_uids.add(new_asset.uid)
             if digest:
                 seen_hashes[digest] = new_asset
             for key in _url_keys(new_asset):
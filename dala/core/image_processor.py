@@ -737,10 +737,11 @@ class ImageProcessor(BaseImageProcessor):
 
     @staticmethod
     def _strip_processed_image_attrs(img_tag: Tag) -> None:
-        for attr in list(img_tag.attrs.keys()):
-            if img_tag.has_attr(attr):
-                if attr in ImageProcessor.PROCESSED_IMAGE_ATTRS or attr.startswith("data-"):
-                    del img_tag[attr]
+        processed = ImageProcessor.PROCESSED_IMAGE_ATTRS
+        img_tag.attrs = {
+            k: v for k, v in img_tag.attrs.items()
+            if k not in processed and not k.startswith("data-")
+        }
 
     @staticmethod
     def _find_existing_asset(book_assets: list, url: str) -> Optional[ImageAsset]:
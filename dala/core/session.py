@@ -6,7 +6,7 @@ import random
 from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Any, Tuple
 from aiohttp.resolver import ThreadedResolver
-from ..models import log, REQUEST_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from ..models import log, json_loads, REQUEST_TIMEOUT, MAX_RETRIES, RETRY_DELAY
 
 def load_cookie_file(path: str) -> List[Dict[str, str]]:
     """Parse Netscape cookie file format into a list of dict entries."""
@@ -25,17 +25,31 @@ def load_cookie_file(path: str) -> List[Dict[str, str]]:
         log.warning(f"Failed to parse cookies file {path}: {e}")
     return cookies
 
-@asynccontextmanager
-async def get_session():
+def _build_connector() -> aiohttp.TCPConnector:
     # Use threaded DNS to avoid pycares issues on Termux/Android and force IPv4 where needed
-    connector = aiohttp.TCPConnector(
+    return aiohttp.TCPConnector(
         resolver=ThreadedResolver(),
         ttl_dns_cache=300,
         family=socket.AF_INET
     )
-    async with aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, connector=connector) as session:
+
+@asynccontextmanager
+async def get_session():
+    async with aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, connector=_build_connector()) as session:
         yield session
 
+def session_with_cookies(parent, cookies) -> aiohttp.ClientSession:
+    """Create a session with its own cookie jar that shares ``parent``'s connection pool.
+
+    The returned session does not own the connector, so closing it leaves the
+    parent's keep-alive connections intact. Falls back to a fresh connector when
+    the parent has none to share.
+    """
+    connector = getattr(parent, "connector", None)
+    if isinstance(connector, aiohttp.BaseConnector) and not connector.closed:
+        return aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, cookies=cookies, connector=connector, connector_owner=False)
+    return aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, cookies=cookies, connector=_build_connector())
+
 async def fetch_with_retry(
     session,
     url,
@@ -81,7 +95,7 @@ async def fetch_with_retry(
 
                 response.raise_for_status()
 
-                if response_type == 'json': return await response.json(), final_url
+                if response_type == 'json': return json_loads(await response.read()), final_url
                 elif response_type == 'bytes': return await response.read(), final_url
                 elif response_type == 'text': return await response.text(encoding='utf-8', errors='replace'), final_url
                 elif response_type == 'headers': return response.headers, final_url
@@ -4,6 +4,8 @@ import logging
 import os
 import re
 import tempfile
+import time
+import zipfile
 from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from pathlib import Path
@@ -611,6 +613,62 @@ def epub_reading_css() -> str:
             body { font-family: Georgia, serif; margin: 0.65em; color: #111; line-height: 1.46; }
         """ + shared_reading_css()
 
+# Slice size used when streaming an item's bytes into the EPUB archive.
+_ZIP_STREAM_CHUNK = 1 << 20
+
+# Image formats that still shrink under deflate; every other ``image/*`` item
+# is already compressed and is stored as-is.
+_DEFLATED_IMAGE_TYPES = frozenset({"image/bmp", "image/svg+xml"})
+
+
+def _stores_uncompressed(media_type: str) -> bool:
+    media_type = (media_type or "").lower()
+    return media_type.startswith("image/") and media_type not in _DEFLATED_IMAGE_TYPES
+
+
+class _StreamingEpubZipWriter(epub.EpubWriter):
+    """ebooklib writer that streams each item into the archive.
+
+    ``ZipFile.writestr`` compresses a whole payload in one call, so every large
+    image briefly exists twice (raw and compressed). Writing through
+    ``ZipFile.open`` compresses slice by slice, and each item's content is
+    produced right before it is written and dropped right after. JPEG, PNG,
+    GIF and WebP payloads are stored without deflate, which only burns CPU on
+    them for no size gain.
+    """
+
+    def _write_items(self):
+        folder = self.book.FOLDER_NAME
+        for item in self.book.get_items():
+            if isinstance(item, epub.EpubNcx):
+                name, data = f"{folder}/{item.file_name}", self._get_ncx()
+            elif isinstance(item, epub.EpubNav):
+                name, data = f"{folder}/{item.file_name}", self._get_nav(item)
+            elif item.manifest:
+                name, data = f"{folder}/{item.file_name}", item.get_content()
+            else:
+                name, data = item.file_name, item.get_content()
+            stored = _stores_uncompressed(getattr(item, "media_type", ""))
+            self._write_entry(name, data, stored=stored)
+
+    def _zip_info(self, name: str, compress_type: int) -> zipfile.ZipInfo:
+        # Opening by bare name would stamp 1980-01-01; writestr used the current time.
+        info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        info.compress_type = compress_type
+        info._compresslevel = self.out.compresslevel
+        info.external_attr = 0o600 << 16
+        return info
+
+    def _write_entry(self, name: str, data, stored: bool = False) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        view = memoryview(data)
+        info = self._zip_info(name, zipfile.ZIP_STORED if stored else self.out.compression)
+        with self.out.open(info, "w") as fh:
+            for start in range(0, len(view), _ZIP_STREAM_CHUNK):
+                fh.write(view[start:start + _ZIP_STREAM_CHUNK])
+
+
 class EpubWriter:
     @staticmethod
     def write(book_data: BookData, output_path: str, custom_css: str = None):
@@ -675,7 +733,12 @@ class EpubWriter:
         book.add_item(epub.EpubNav())
         book.spine = ['nav'] + epub_chapters
 
-        epub.write_epub(output_path, book)
+        writer = _StreamingEpubZipWriter(output_path, book)
+        writer.process()
+        try:
+            writer.write()
+        except OSError as e:
+            raise OutputWriteError(f"Failed to write EPUB {output_path}: {e}") from e
         log.info(f"Wrote EPUB: {output_path}")
 
 
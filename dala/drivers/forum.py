@@ -1,9 +1,13 @@
+import asyncio
 import html
 import re
 import hashlib
 import mimetypes
 import os
+from functools import lru_cache
 from urllib.parse import urlparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
 from bs4 import BeautifulSoup
 from ebooklib import epub
@@ -11,13 +15,63 @@ from typing import List, Dict, Optional, Any, Tuple
 
 from .base import BaseDriver
 from ..models import (
-    log, BookData, ConversionContext, Source, Chapter, ImageAsset, IMAGE_DIR_IN_EPUB, sanitize_filename
+    log, BookData, ConversionContext, Source, Chapter, ImageAsset, IMAGE_DIR_IN_EPUB, HTML_PARSER, sanitize_filename
 )
-from ..core.image_processor import ForumImageProcessor
+from ..core.image_processor import ForumImageProcessor, ImageProcessor
+from ..core.forum_image_processor import AssetStore
 from ..core.extractor import ArticleExtractor
 from ..core.session import fetch_with_retry
 from ..utils.llm import LLMHelper
 
+_POST_ID_DIGITS_RE = re.compile(r'(\d+)')
+_PAGE_RE = re.compile(r'page[-=](\d+)', re.IGNORECASE)
+_PAGINATION_LINK_SELECTOR = ".pageNav a, .pageNavSimple a, .pagination a, nav a"
+_PAGE_FETCH_CONCURRENCY = 8
+# Pages fetched ahead of the crawl when only --max-pages bounds it.
+_PAGE_LOOKAHEAD = 2
+# Opening <a> tags (quoted attribute values may contain '>') and their attributes.
+_ANCHOR_TAG_RE = re.compile(r'<a\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.IGNORECASE)
+_TAG_ATTR_RE = re.compile(r'([^\s"\'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+_QUOTE_ID_RE = re.compile(r'id=(\d+)')
+_QUOTE_POST_RE = re.compile(r'post-(\d+)')
+_QUOTE_LINK_DROP_ATTRS = frozenset({"href", "data-xf-click", "data-content-selector"})
+_HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+@lru_cache(maxsize=1024)
+def _page_number_from_href(href: str) -> Optional[int]:
+    # Pagination hrefs repeat across every page of a thread.
+    m = _PAGE_RE.search(href)
+    if m:
+        try:
+            return int(m.group(1))
+        except Exception:
+            return None
+    return None
+
+def _content_prefix_key(content: bytes) -> Tuple[int, bytes]:
+    return len(content), content[:64]
+
+def _content_digest(content: bytes) -> Optional[bytes]:
+    try:
+        return hashlib.blake2b(content, digest_size=16).digest()
+    except Exception:
+        return None
+
+def _is_page_segment(segment: str) -> bool:
+    return segment.startswith("page-") and segment[5:].isdigit()
+
+def _with_page_segment(path: str, page: int) -> str:
+    """Point a XenForo-style ``/page-N`` path at ``page``, appending the segment if missing."""
+    segments = path.split("/")
+    replaced = False
+    for i, segment in enumerate(segments):
+        if _is_page_segment(segment):
+            segments[i] = f"page-{page}"
+            replaced = True
+    if replaced:
+        return "/".join(segments)
+    return f"{path.rstrip('/')}/page-{page}"
+
 class ForumDriver(BaseDriver):
     async def prepare_book_data(self, context: ConversionContext, source: Source) -> Optional[BookData]:
         session = context.session
@@ -26,7 +80,9 @@ class ForumDriver(BaseDriver):
         log.info(f"Forum Driver processing: {base_url}")
 
         assets: List[ImageAsset] = []
+        asset_store = AssetStore(assets)
         page_blocks: List[Tuple[int, List[Dict[str, Any]]]] = []
+        total_posts = 0
         title = None
 
         target_pages = options.page_spec or []
@@ -60,16 +116,15 @@ class ForumDriver(BaseDriver):
                 mime = a.get("media_type") or a.get("content_type") or "image/jpeg"
                 fname_base = sanitize_filename(os.path.splitext(os.path.basename(path_val))[0])
                 if len(fname_base) < 3:
-                    fname_base = f"img_{abs(hash(a.get('original_url') or a.get('viewer_url') or seeded))}"
+                    fname_base = f"img_{ImageProcessor._short_stable_hash(url_like)}"
                 ext = os.path.splitext(path_val)[1]
                 if not ext or not ext.startswith("."):
                     ext = mimetypes.guess_extension(mime) or ".img"
                 fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}{ext}"
                 count = 0
-                while any(existing.filename == fname for existing in assets):
+                while asset_store.filename_taken(fname):
                     count += 1
                     fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}_{count}{ext}"
-                uid = f"img_{abs(hash(fname))}"
                 alt_urls = []
                 viewer = a.get("viewer_url")
                 canonical = a.get("canonical_url")
@@ -79,83 +134,118 @@ class ForumDriver(BaseDriver):
                         alt_urls.append(u)
                         if "?" in u:
                             alt_urls.append(u.split("?", 1)[0])
-                assets.append(ImageAsset(uid=uid, filename=fname, media_type=mime, content=raw, original_url=url_like, alt_urls=alt_urls))
+                asset_store.add(ImageAsset(uid=AssetStore.uid_for(fname), filename=fname, media_type=mime, content=raw, original_url=url_like, alt_urls=alt_urls))
                 seeded += 1
             log.info(f"Seeded {seeded} preloaded assets into EPUB.")
 
-        while True:
-            if target_pages:
-                if not pages_sequence:
-                    break
-                page = pages_sequence.pop(0)
-            else:
-                if max_pages and page > max_pages:
-                    break
-
-            if page in seen_pages:
-                page += 1
-                continue
-
-            page_url = self._build_page_url(base_url, page)
-            if page in browser_pages:
-                page_info = browser_pages[page]
-                html_content = page_info.get("html") or ""
-                final_url = page_info.get("url") or page_url
-                log.info(f"Using browser-fetched forum HTML for page {page}.")
-            elif page == 1 and source.html:
-                html_content = source.html
-                final_url = source.url
-                log.info("Using pre-fetched forum HTML content.")
-            else:
-                html_content, final_url = await fetch_with_retry(session, page_url, 'text')
-            if not html_content:
+        # Explicit page lists are fetched concurrently up front. --max-pages is
+        # only a cap, so there we keep a small window ahead of the crawl that
+        # stops growing once the thread runs out of pages. Results are always
+        # consumed in page order below.
+        prefetched: Dict[int, asyncio.Task] = {}
+        lookahead = bool(max_pages) and not target_pages
+
+        def schedule_prefetch(pages) -> None:
+            wanted = [
+                p for p in pages
+                if p not in prefetched and p not in seen_pages and p not in browser_pages
+                and not (p == 1 and source.html) and (not lookahead or p <= max_pages)
+            ]
+            # Only explicitly requested pages are certain to be consumed, so
+            # only those are parsed ahead; look-ahead pages parse on use.
+            prefetched.update(self._prefetch_pages(session, base_url, wanted, parse=not lookahead))
+
+        if target_pages:
+            schedule_prefetch(target_pages)
+        elif lookahead:
+            schedule_prefetch(range(page, page + _PAGE_LOOKAHEAD))
+
+        try:
+            while True:
                 if target_pages:
-                    log.warning(f"Page {page} missing.")
+                    if not pages_sequence:
+                        break
+                    page = pages_sequence.pop(0)
+                else:
+                    if max_pages and page > max_pages:
+                        break
+
+                if page in seen_pages:
+                    page += 1
                     continue
+
+                page_url = self._build_page_url(base_url, page)
+                soup = None
+                if page in browser_pages:
+                    page_info = browser_pages[page]
+                    html_content = page_info.get("html") or ""
+                    final_url = page_info.get("url") or page_url
+                    log.info(f"Using browser-fetched forum HTML for page {page}.")
+                elif page == 1 and source.html:
+                    html_content = source.html
+                    final_url = source.url
+                    log.info("Using pre-fetched forum HTML content.")
                 else:
-                    break
-            if final_url in seen_urls:
-                log.info(f"Final URL for page {page} already seen. Stopping to avoid loop: {final_url}")
-                break
-            seen_urls.add(final_url)
-
-            soup = BeautifulSoup(html_content, 'lxml')
-            if not title:
-                title = self._extract_title(soup, base_url)
-
-            if source.assets and page == 1:
-                log.debug(f"Preloaded assets received: {len(source.assets)}")
-                for a in source.assets[:3]:
-                    log.debug(f"Asset sample original={a.get('original_url')} viewer={a.get('viewer_url')} canonical={a.get('canonical_url')} type={a.get('content_type')}")
-
-            if not options.no_images:
-                base_for_imgs = final_url or base_url
-                await ForumImageProcessor.process_images(session, soup, base_for_imgs, assets, preloaded_assets=source.assets, options=options)
-
-            posts = self._extract_posts(soup)
-            if posts:
-                if max_posts:
-                    remaining = max_posts - sum(len(b[1]) for b in page_blocks)
-                    if remaining <= 0:
+                    prefetch = prefetched.pop(page, None)
+                    if prefetch is not None:
+                        html_content, final_url, soup = await prefetch
+                    else:
+                        html_content, final_url = await fetch_with_retry(session, page_url, 'text')
+                if not html_content:
+                    if target_pages:
+                        log.warning(f"Page {page} missing.")
+                        continue
+                    else:
                         break
-                    posts = list(islice(posts, remaining))
-                page_blocks.append((page, posts))
-            if max_posts and sum(len(b[1]) for b in page_blocks) >= max_posts:
-                break
+                if final_url in seen_urls:
+                    log.info(f"Final URL for page {page} already seen. Stopping to avoid loop: {final_url}")
+                    break
+                seen_urls.add(final_url)
+
+                if soup is None:
+                    soup = BeautifulSoup(html_content, HTML_PARSER)
+                if not title:
+                    title = self._extract_title(soup, base_url)
+
+                if source.assets and page == 1:
+                    log.debug(f"Preloaded assets received: {len(source.assets)}")
+                    for a in source.assets[:3]:
+                        log.debug(f"Asset sample original={a.get('original_url')} viewer={a.get('viewer_url')} canonical={a.get('canonical_url')} type={a.get('content_type')}")
+
+                if not options.no_images:
+                    base_for_imgs = final_url or base_url
+                    await ForumImageProcessor.process_images(session, soup, base_for_imgs, asset_store, preloaded_assets=source.assets, options=options)
+
+                posts = self._extract_posts(soup)
+                if posts:
+                    if max_posts:
+                        remaining = max_posts - total_posts
+                        if remaining <= 0:
+                            break
+                        posts = list(islice(posts, remaining))
+                    page_blocks.append((page, posts))
+                    total_posts += len(posts)
+                if max_posts and total_posts >= max_posts:
+                    break
 
-            seen_pages.add(page)
-            if target_pages:
-                continue
+                seen_pages.add(page)
+                if target_pages:
+                    continue
 
-            next_browser_page = page + 1
-            if next_browser_page in browser_pages and (not max_pages or next_browser_page <= max_pages):
-                page = next_browser_page
-                continue
+                next_browser_page = page + 1
+                if next_browser_page in browser_pages and (not max_pages or next_browser_page <= max_pages):
+                    page = next_browser_page
+                    continue
 
-            has_next = self._has_next_page(soup, page, final_url)
-            if not has_next:
-                break
-            page += 1
+                has_next = self._has_next_page(soup, page, final_url)
+                if not has_next:
+                    break
+                page += 1
+                if lookahead:
+                    schedule_prefetch(range(page, page + _PAGE_LOOKAHEAD))
+        finally:
+            for task in prefetched.values():
+                task.cancel()
 
         if not page_blocks:
             log.error("Forum extraction produced no posts.")
@@ -206,35 +296,50 @@ class ForumDriver(BaseDriver):
             toc_structure=toc_links
         )
 
+    def _prefetch_pages(self, session, base_url: str, pages, parse: bool = True) -> Dict[int, asyncio.Task]:
+        """Schedule bounded concurrent fetches for the given page numbers.
+
+        With ``parse`` set, each task also parses its page on a worker thread,
+        so later pages are already soups by the time the in-order loop reaches
+        them.
+        """
+        sem = asyncio.Semaphore(_PAGE_FETCH_CONCURRENCY)
+
+        async def fetch(page_url):
+            async with sem:
+                html_content, final_url = await fetch_with_retry(session, page_url, 'text')
+            soup = None
+            if parse and html_content:
+                soup = await asyncio.to_thread(BeautifulSoup, html_content, HTML_PARSER)
+            return html_content, final_url, soup
+
+        tasks: Dict[int, asyncio.Task] = {}
+        for page in pages:
+            if page not in tasks:
+                tasks[page] = asyncio.create_task(fetch(self._build_page_url(base_url, page)))
+        return tasks
+
     def _normalize_url(self, url: str) -> str:
-        cleaned = url.rstrip('/')
-        if "page-" in cleaned:
-            cleaned = re.sub(r'/page-\d+', '', cleaned)
-        cleaned = re.sub(r'([?&])page=\d+', r'\1', cleaned)
-        cleaned = cleaned.rstrip('?&')
-        return cleaned
+        parsed = urlparse(url.rstrip('/'))
+        path = parsed.path
+        if "page-" in path:
+            path = "/".join(seg for seg in path.split("/") if not _is_page_segment(seg))
+        query = parsed.query
+        if query:
+            params = query.split("&")
+            if params[0].startswith("threads/") and "page-" in params[0]:
+                params[0] = "/".join(seg for seg in params[0].rstrip("/").split("/") if not _is_page_segment(seg))
+            query = "&".join(p for p in params if p and not (p.startswith("page=") and p[5:].isdigit()))
+        return parsed._replace(path=path, query=query).geturl()
 
     def _build_page_url(self, base_url: str, page: int) -> str:
         if page <= 1:
             return base_url
         parsed = urlparse(base_url)
-        path = parsed.path or ""
-        query = parsed.query or ""
-        if query and query.startswith("threads/"):
-            q = query
-            if re.search(r'page-\d+', q):
-                q = re.sub(r'page-\d+', f"page-{page}", q)
-            else:
-                q = q.rstrip('/') + f"/page-{page}"
-            return parsed._replace(query=q).geturl()
-        if re.search(r'page-\d+', path):
-            new_path = re.sub(r'page-\d+', f"page-{page}", path)
-        elif path.endswith('/'):
-            new_path = f"{path}page-{page}"
-        else:
-            new_path = f"{path}/page-{page}"
-        rebuilt = parsed._replace(path=new_path)
-        return rebuilt.geturl()
+        query = parsed.query
+        if query.startswith("threads/"):
+            return parsed._replace(query=_with_page_segment(query, page)).geturl()
+        return parsed._replace(path=_with_page_segment(parsed.path, page)).geturl()
 
     def _browser_page_map(self, source: Source) -> Dict[int, Dict[str, str]]:
         pages: Dict[int, Dict[str, str]] = {}
@@ -270,7 +375,7 @@ class ForumDriver(BaseDriver):
         seen_ids = set()
         containers = soup.select("article.message.message--post, li.message, article.message")
         if not containers:
-            containers = soup.find_all(lambda tag: tag.get("class") and any("message" in c for c in tag.get("class")))
+            containers = soup.select('[class*="message"]')
         for c in containers:
             pid_raw = c.get("id") or c.get("data-content") or ""
             if pid_raw in ("messageList",):
@@ -278,7 +383,7 @@ class ForumDriver(BaseDriver):
             anchor_id = sanitize_filename(pid_raw) if pid_raw else f"post_{len(posts)+1}"
             num_id = None
             try:
-                m = re.search(r'(\d+)', pid_raw)
+                m = _POST_ID_DIGITS_RE.search(pid_raw)
                 if m:
                     num_id = m.group(1)
             except Exception:
@@ -289,7 +394,7 @@ class ForumDriver(BaseDriver):
             seen_ids.add(key)
 
             author = None
-            author_tag = c.find(lambda t: t.get("class") and any("username" in x or "author" in x for x in t.get("class")))
+            author_tag = c.select_one('[class*="username"], [class*="author"]')
             if not author and c.has_attr("data-author"):
                 author = c.get("data-author")
             if author_tag:
@@ -299,7 +404,7 @@ class ForumDriver(BaseDriver):
 
             content_tag = c.select_one(".message-body") or c.select_one(".message-content") or c.select_one(".messageContent")
             if not content_tag:
-                content_tag = c.find(lambda t: t.get("class") and any("messageContent" in x or "bbWrapper" in x or "content" == x for x in t.get("class")))
+                content_tag = c.select_one('[class*="messageContent"], [class*="bbWrapper"], .content')
             if not content_tag:
                 continue
             time_val = None
@@ -318,13 +423,7 @@ class ForumDriver(BaseDriver):
 
     def _extract_page_number(self, href: str) -> Optional[int]:
         if not href: return None
-        m = re.search(r'page[-=](\d+)', href, re.IGNORECASE)
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                return None
-        return None
+        return _page_number_from_href(href)
 
     def _has_next_page(self, soup, current_page: int, current_url: str) -> bool:
         if current_page > 500:
@@ -351,14 +450,14 @@ class ForumDriver(BaseDriver):
             if maybe and maybe <= current_page:
                 return False
             return True
-        anchors = soup.find_all("a")
-        for a in anchors:
+        next_num = str(current_page + 1)
+        for a in soup.select(_PAGINATION_LINK_SELECTOR):
             txt = a.get_text(strip=True).lower()
-            if txt in ("next", "next >", "next>"):
-                return True
-            if txt == str(current_page + 1):
+            if txt in ("next", "next >", "next>") or txt == next_num:
                 return True
-        return False
+        # Outside pagination containers, only consider anchors whose own text is the label.
+        label_re = re.compile(rf'^\s*(?:next\s*>?|{next_num})\s*$', re.IGNORECASE)
+        return soup.find("a", string=label_re) is not None
 
     def _render_thread_html(self, title, url, page_blocks: List[Tuple[int, List[Dict[str, Any]]]], summary_html: Optional[str] = None):
         anchor_map: Dict[str, str] = {}
@@ -373,40 +472,81 @@ class ForumDriver(BaseDriver):
                     anchor_map[num] = anchor
                     anchor_map[f"post-{num}"] = anchor
 
+        # Bound once; the rewriters below run per anchor tag across the thread.
+        anchor_get = anchor_map.get
+        unescape, escape = html.unescape, html.escape
+        find_attrs = _TAG_ATTR_RE.findall
+        drop_attrs = _QUOTE_LINK_DROP_ATTRS
+
+        def quote_target(attrs: Dict[str, str]) -> Optional[str]:
+            cls = attrs.get("class", "")
+            if "bbCodeBlock-sourceJump" not in cls and "AttributionLink" not in cls:
+                return None
+            sel = attrs.get("data-content-selector", "").lstrip("#")
+            if sel:
+                return sel
+            href = attrs.get("href")
+            if href:
+                m = _QUOTE_ID_RE.search(href) or _QUOTE_POST_RE.search(href)
+                if m:
+                    return m.group(1)
+            return None
+
+        def rewrite_anchor(match) -> str:
+            raw_attrs = find_attrs(match.group(1))
+            attrs = {
+                name.lower(): unescape(dq or sq or bare)
+                for name, dq, sq, bare in raw_attrs
+            }
+            target = quote_target(attrs)
+            target_anchor = anchor_get(target) if target else None
+            if target_anchor is None:
+                return match.group(0)
+            kept = [
+                name if not (dq or sq or bare) else f'{name}="{escape(unescape(dq or sq or bare))}"'
+                for name, dq, sq, bare in raw_attrs
+                if name.lower() not in drop_attrs
+            ]
+            kept.append(f'href="#p_{target_anchor}"')
+            return f"<a {' '.join(kept)}>"
+
+        def rewrite_quote_links_soup(html_snippet: str) -> str:
+            soup = BeautifulSoup(html_snippet, HTML_PARSER)
+            body = soup.body if soup.body else soup
+            for a in body.find_all("a"):
+                attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in a.attrs.items()}
+                target = quote_target(attrs)
+                target_anchor = anchor_get(target) if target else None
+                if target_anchor is not None:
+                    a['href'] = f"#p_{target_anchor}"
+                    for attr in ("data-xf-click", "data-content-selector"):
+                        if a.has_attr(attr):
+                            del a[attr]
+            return body.decode_contents()
+
         def rewrite_quote_links(html_snippet: str) -> str:
             if not html_snippet:
                 return html_snippet
+            # Most posts quote nobody; skip them without touching the markup.
+            markers = html_snippet.count("bbCodeBlock-sourceJump") + html_snippet.count("AttributionLink")
+            if not markers:
+                return html_snippet
+            seen = 0
+
+            def rewrite(match) -> str:
+                nonlocal seen
+                tag = match.group(0)
+                seen += tag.count("bbCodeBlock-sourceJump") + tag.count("AttributionLink")
+                return rewrite_anchor(match)
+
+            rewritten = _ANCHOR_TAG_RE.sub(rewrite, html_snippet)
+            if seen == markers:
+                return rewritten
+            # A marker sits outside any tag the regex could parse (e.g. an
+            # unquoted value containing a quote); let the HTML parser decide.
             try:
-                soup = BeautifulSoup(html_snippet, 'html.parser')
-                links = soup.find_all("a")
-                for a in links:
-                    cls = " ".join(a.get("class", [])) if a.get("class") else ""
-                    target = None
-                    if "bbCodeBlock-sourceJump" in cls or "AttributionLink" in cls:
-                        sel = a.get("data-content-selector")
-                        if sel and isinstance(sel, str):
-                            sel = sel.lstrip("#")
-                            if sel:
-                                target = sel
-                        if not target:
-                            href = a.get("href")
-                            if href:
-                                m = re.search(r'id=(\d+)', href)
-                                if m:
-                                    target = m.group(1)
-                                else:
-                                    m2 = re.search(r'post-(\d+)', href)
-                                    if m2:
-                                        target = m2.group(1)
-                    if target and target in anchor_map:
-                        anchor = anchor_map[target]
-                        a['href'] = f"#p_{anchor}"
-                        if a.has_attr("data-xf-click"):
-                            del a["data-xf-click"]
-                        if a.has_attr("data-content-selector"):
-                            del a["data-content-selector"]
-                return str(soup)
-            except Exception as e:
+                return rewrite_quote_links_soup(html_snippet)
+            except Exception:
                 return html_snippet
 
         chunks = []
@@ -414,48 +554,71 @@ class ForumDriver(BaseDriver):
         if summary_html:
             chunks.append(f"<div class='ai-summary'><h3>AI Summary</h3>{summary_html}</div><hr/>")
 
+        # Authors (and often timestamps) repeat throughout a thread; escape each distinct value once.
+        escaped: Dict[str, str] = {}
+
+        def escape_once(value: str) -> str:
+            out = escaped.get(value)
+            if out is None:
+                out = escaped[value] = html.escape(value)
+            return out
+
         post_counter = 1
         for page_no, posts in page_blocks:
             chunks.append(f"<div class='page-label' id='page_{page_no}'>Page {page_no}</div>")
             for post in posts:
                 anchor_id = post.get("anchor_id") or sanitize_filename(post.get("id") or f"post_{post_counter}")
                 pid = anchor_id
-                author = html.escape(post.get("author") or "Anonymous")
-                when = html.escape(post.get("time") or "")
-                chunks.append(f"<div class='forum-post' id='p_{pid}'>")
-                chunks.append(f"<div class='forum-post-header'><span class='forum-author'>{author}</span>")
-                if when: chunks.append(f"<span class='forum-time'>{when}</span>")
-                chunks.append("</div>")
+                author = escape_once(post.get("author") or "Anonymous")
+                when = escape_once(post.get("time") or "")
+                time_html = f"<span class='forum-time'>{when}</span>" if when else ""
                 body_html = rewrite_quote_links(post.get('html',''))
-                chunks.append(f"<div class='forum-post-body'>{body_html}</div>")
-                chunks.append("</div>")
+                chunks.append(
+                    f"<div class='forum-post' id='p_{pid}'>"
+                    f"<div class='forum-post-header'><span class='forum-author'>{author}</span>{time_html}</div>"
+                    f"<div class='forum-post-body'>{body_html}</div>"
+                    "</div>"
+                )
                 post_counter += 1
         body_html = "".join(chunks)
         meta_html = ArticleExtractor.build_meta_block(url, {"sitename": urlparse(url).netloc})
         return ArticleExtractor.build_article_html(title, body_html, meta_html=meta_html)
 
     def _dedupe_assets(self, assets: List[ImageAsset], html: str) -> Tuple[List[ImageAsset], str]:
-        seen: Dict[str, ImageAsset] = {}
+        seen: Dict[Any, ImageAsset] = {}
         keep: List[ImageAsset] = []
         replace_map: Dict[str, str] = {}
 
+        # Identical images must share size and leading bytes; only assets whose
+        # (size, prefix) key collides with another asset need a full digest.
+        prefix_keys = {id(a): _content_prefix_key(a.content) for a in assets if a.content}
+        prefix_counts = Counter(prefix_keys.values())
+        to_hash = [a for a in assets if a.content and prefix_counts[prefix_keys[id(a)]] > 1]
+        # hashlib releases the GIL on large buffers, so big batches hash in parallel.
+        if len(to_hash) > 1 and _HASH_WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=_HASH_WORKERS) as pool:
+                digests = dict(zip(map(id, to_hash), pool.map(_content_digest, (a.content for a in to_hash))))
+        else:
+            digests = {id(a): _content_digest(a.content) for a in to_hash}
+
         for a in assets:
             if not a.content:
                 keep.append(a)
                 continue
-            try:
-                h = hashlib.sha1(a.content).hexdigest()
-            except Exception:
+            key = digests.get(id(a), prefix_keys[id(a)])
+            if key is None:
                 keep.append(a)
                 continue
-            if h in seen:
-                replace_map[a.filename] = seen[h].filename
+            if key in seen:
+                replace_map[a.filename] = seen[key].filename
             else:
-                seen[h] = a
+                seen[key] = a
                 keep.append(a)
 
         if replace_map and html:
-            for old, new in replace_map.items():
-                html = html.replace(old, new)
+            # One scan for every duplicate; longest names first so a filename
+            # never matches as part of a longer one.
+            pattern = re.compile("|".join(re.escape(old) for old in sorted(replace_map, key=len, reverse=True)))
+            html = pattern.sub(lambda m: replace_map[m.group(0)], html)
 
         return keep, html
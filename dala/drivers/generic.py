@@ -9,13 +9,15 @@ from typing import Optional
 
 from .base import BaseDriver
 from ..models import (
-    log, BookData, ConversionContext, Source, Chapter, ImageAsset, IMAGE_DIR_IN_EPUB
+    log, BookData, ConversionContext, Source, Chapter, ImageAsset, IMAGE_DIR_IN_EPUB, HTML_PARSER
 )
 from ..core.extractor import ArticleExtractor
 from ..core.image_processor import ImageProcessor
 from ..core.session import fetch_with_retry
 from ..utils.llm import LLMHelper
 
+_XENFORO_RE = re.compile(r'xenforo', re.IGNORECASE)
+
 class GenericDriver(BaseDriver):
     LINKED_TABLE_HINTS = (
         "table",
@@ -32,6 +34,7 @@ class GenericDriver(BaseDriver):
     def _seed_preloaded_assets(source: Source, assets: list, options=None) -> int:
         seeded = 0
         max_dim, quality, color_mode, output_pref = ImageProcessor.image_optimize_params(options)
+        used_names = {existing.filename for existing in assets}
         for item in source.assets or []:
             raw = item.get("content")
             if isinstance(raw, str):
@@ -63,7 +66,7 @@ class GenericDriver(BaseDriver):
                 ext = mimetypes.guess_extension(mime) or ".img"
             fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}{ext}"
             count = 0
-            while any(existing.filename == fname for existing in assets):
+            while fname in used_names:
                 count += 1
                 fname = f"{IMAGE_DIR_IN_EPUB}/{fname_base}_{count}{ext}"
             alt_urls = []
@@ -80,6 +83,7 @@ class GenericDriver(BaseDriver):
                 original_url=url_like,
                 alt_urls=list(dict.fromkeys(alt_urls)) or None,
             ))
+            used_names.add(fname)
             seeded += 1
         return seeded
 
@@ -94,7 +98,7 @@ class GenericDriver(BaseDriver):
         soups = [body_soup]
         if raw_html:
             try:
-                soups.append(BeautifulSoup(raw_html, "html.parser"))
+                soups.append(BeautifulSoup(raw_html, HTML_PARSER))
             except Exception:
                 pass
 
@@ -207,7 +211,7 @@ class GenericDriver(BaseDriver):
             )
             if not linked_html:
                 continue
-            linked_soup = BeautifulSoup(linked_html, "html.parser")
+            linked_soup = BeautifulSoup(linked_html, HTML_PARSER)
             for table in linked_soup.find_all("table")[:20]:
                 simplified = GenericDriver._simplified_table(table, factory)
                 if not simplified:
@@ -260,13 +264,13 @@ class GenericDriver(BaseDriver):
              from .substack import SubstackDriver
              return await SubstackDriver().prepare_book_data(context, source)
 
-        if 'data-template="thread_view"' in raw_html or 'xenforo' in raw_html.lower():
+        if raw_html.find('data-template="thread_view"') != -1 or _XENFORO_RE.search(raw_html):
              log.info("Detected Forum metadata after fetch. Switching to ForumDriver.")
              from .forum import ForumDriver
              return await ForumDriver().prepare_book_data(context, source)
 
         title = data['title'] or "Untitled Webpage"
-        soup = BeautifulSoup(data['html'], 'html.parser')
+        soup = BeautifulSoup(data['html'], HTML_PARSER)
         body_soup = soup.body if soup.body else soup
         base_for_links = data.get('archive_url') if data.get('was_archived') else data.get('source_url', url)
         await self._append_linked_reference_tables(session, raw_html, body_soup, base_for_links)
@@ -323,7 +327,7 @@ class GenericDriver(BaseDriver):
                     data = archive_data
                     raw_html = data.get('raw_html_for_metadata') or data.get('html', '')
                     title = data['title'] or title
-                    soup = BeautifulSoup(data['html'], 'html.parser')
+                    soup = BeautifulSoup(data['html'], HTML_PARSER)
                     body_soup = soup.body if soup.body else soup
                     assets = []
                     archive_base = data.get('archive_url') or data.get('source_url', url)
@@ -347,7 +351,7 @@ class GenericDriver(BaseDriver):
             text_content = body_soup.get_text(separator=" ", strip=True)
             summary_html = await LLMHelper.generate_summary(text_content, options.llm_model, options.llm_api_key, options.llm_provider)
 
-        chapter_html = body_soup.prettify()
+        chapter_html = body_soup.decode_contents()
         meta_html = ArticleExtractor.build_meta_block(url, data, summary_html=summary_html)
 
         final_html = ArticleExtractor.build_article_html(title, chapter_html, meta_html=meta_html, include_hr=True)
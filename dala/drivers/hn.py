@@ -2,19 +2,18 @@ import asyncio
 from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup
 from ebooklib import epub
-from pygments.formatters import HtmlFormatter
 from typing import List, Dict, Optional
 
 from .base import BaseDriver
 from ..models import (
-    log, BookData, ConversionContext, Source, Chapter, HN_API_BASE_URL
+    log, BookData, ConversionContext, Source, Chapter, HN_API_BASE_URL, HTML_PARSER
 )
 from ..core.extractor import ArticleExtractor
 from ..core.image_processor import ImageProcessor
 from ..core.session import fetch_with_retry
 from ..core.profiles import ProfileManager
 from ..utils.llm import LLMHelper
-from ..utils.formatting import _enrich_comment_tree, format_comment_html, fetch_comments_recursive
+from ..utils.formatting import _enrich_comment_tree, format_comment_html, _HTML_FMT, fetch_comments_recursive
 
 class HackerNewsDriver(BaseDriver):
     async def prepare_book_data(self, context: ConversionContext, source: Source) -> Optional[BookData]:
@@ -97,7 +96,7 @@ class HackerNewsDriver(BaseDriver):
                 )
                 if art_data['success']:
                     if art_data['title']: art_title = art_data['title']
-                    soup = BeautifulSoup(art_data['html'], 'html.parser')
+                    soup = BeautifulSoup(art_data['html'], HTML_PARSER)
                     body = soup.body if soup.body else soup
                     
                     if options.summary:
@@ -108,7 +107,7 @@ class HackerNewsDriver(BaseDriver):
                     if not options.no_images:
                         base = art_data.get('archive_url') if art_data.get('was_archived') else article_url
                         await ImageProcessor.process_images(session, body, base, assets, options=options)
-                    art_html = body.prettify()
+                    art_html = body.decode_contents()
                     context_html = f"<p><strong>HN Source:</strong> <a href=\"{url}\">{title}</a></p>"
                     meta_html = ArticleExtractor.build_meta_block(article_url, art_data, context=context_html, summary_html=summary_html)
                     art_html = f"{meta_html}<hr/>{art_html}"
@@ -136,11 +135,10 @@ class HackerNewsDriver(BaseDriver):
             top_comments = sorted([c for c in raw_comments if c], key=lambda c: c.get('time', 0))
             enriched_roots = _enrich_comment_tree(top_comments)
 
-            fmt = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
             chunks = []
             for i, comment in enumerate(enriched_roots):
                 chunks.append(f"<div class='thread-container'>")
-                chunks.append(format_comment_html(comment, fmt))
+                chunks.append(format_comment_html(comment, _HTML_FMT))
                 chunks.append("</div>")
             comments_html = "".join(chunks)
 
@@ -3,18 +3,21 @@ import re
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from ebooklib import epub
-from pygments.formatters import HtmlFormatter
 from typing import List, Dict, Optional, Any
 
 from .base import BaseDriver
 from ..models import (
-    log, BookData, ConversionContext, Source, Chapter
+    log, BookData, ConversionContext, Source, Chapter, HTML_PARSER
 )
 from ..core.extractor import ArticleExtractor
 from ..core.image_processor import ImageProcessor
 from ..core.session import fetch_with_retry
 from ..utils.llm import LLMHelper
-from ..utils.formatting import _enrich_comment_tree, format_comment_html
+from ..utils.formatting import _enrich_comment_tree, format_comment_html, _HTML_FMT
+
+_IMG_EXT_RE = re.compile(r'\.(jpe?g|png|webp|gif)(\?|$)', re.IGNORECASE)
+_IMG_EXT_HINT_RE = re.compile(r'\.(jpe?g|png|webp|gif)\b', re.IGNORECASE)
+_IMG_LINK_SELECTOR = ', '.join(f'a[href*=".{ext}" i]' for ext in ('jpg', 'jpeg', 'png', 'webp', 'gif'))
 
 class RedditDriver(BaseDriver):
     async def prepare_book_data(self, context: ConversionContext, source: Source) -> Optional[BookData]:
@@ -53,29 +56,37 @@ class RedditDriver(BaseDriver):
             link_url = post_data.get("url")
             article_html = ""
             chapter_title = title
-            is_image_link = link_url and re.search(r'\.(jpe?g|png|webp|gif)(\?|$)', link_url, re.IGNORECASE)
+            is_image_link = link_url and _IMG_EXT_RE.search(link_url)
             summary_html = None
 
             if selftext_html:
                 decoded = html.unescape(selftext_html)
-                soup = BeautifulSoup(decoded, 'html.parser')
-                
-                if options.summary:
-                    log.info("Generating AI summary for Reddit Selftext...")
-                    summary_html = await LLMHelper.generate_summary(soup.get_text(separator=" ", strip=True), options.llm_model, options.llm_api_key, options.llm_provider)
-
-                if not options.no_images:
-                    await ImageProcessor.process_images(session, soup, source.url, assets, options=options)
-                article_html = soup.prettify()
+                if options.no_images and not options.summary:
+                    # Nothing to rewrite or summarize, so the decoded fragment is used as-is.
+                    article_html = decoded
+                else:
+                    soup = BeautifulSoup(decoded, HTML_PARSER)
+                    body = soup.body if soup.body else soup
+
+                    if options.summary:
+                        log.info("Generating AI summary for Reddit Selftext...")
+                        summary_html = await LLMHelper.generate_summary(body.get_text(separator=" ", strip=True), options.llm_model, options.llm_api_key, options.llm_provider)
+
+                    if not options.no_images:
+                        await ImageProcessor.process_images(session, body, source.url, assets, options=options)
+                    article_html = body.decode_contents()
                 if summary_html:
                     article_html = f"<div class='ai-summary'><h3>AI Summary</h3>{summary_html}</div><hr/>{article_html}"
 
             elif is_image_link:
                 img_html = f"""<div class="img-block"><img class="epub-image" src="{link_url}" alt="{title}"/></div>"""
-                soup = BeautifulSoup(img_html, 'html.parser')
-                if not options.no_images:
-                    await ImageProcessor.process_images(session, soup, link_url, assets, options=options)
-                article_html = soup.prettify()
+                if options.no_images:
+                    article_html = img_html
+                else:
+                    soup = BeautifulSoup(img_html, HTML_PARSER)
+                    body = soup.body if soup.body else soup
+                    await ImageProcessor.process_images(session, body, link_url, assets, options=options)
+                    article_html = body.decode_contents()
                 context_html = f"<p><strong>Reddit Link:</strong> <a href=\"{source.url}\">{source.url}</a></p>"
                 meta_html = ArticleExtractor.build_meta_block(link_url, {"author": None, "date": None, "sitename": urlparse(link_url).netloc}, context=context_html)
                 article_html = f"{meta_html}<hr/>{article_html}"
@@ -90,7 +101,7 @@ class RedditDriver(BaseDriver):
                 )
                 if art_data['success']:
                     chapter_title = art_data.get('title') or chapter_title
-                    soup = BeautifulSoup(art_data['html'], 'html.parser')
+                    soup = BeautifulSoup(art_data['html'], HTML_PARSER)
                     body = soup.body if soup.body else soup
                     
                     if options.summary:
@@ -100,7 +111,7 @@ class RedditDriver(BaseDriver):
                     if not options.no_images:
                         base = art_data.get('archive_url') if art_data.get('was_archived') else link_url
                         await ImageProcessor.process_images(session, body, base, assets, options=options)
-                    article_html = body.prettify()
+                    article_html = body.decode_contents()
                     context_html = f"<p><strong>Reddit Link:</strong> <a href=\"{source.url}\">{source.url}</a></p>"
                     meta_html = ArticleExtractor.build_meta_block(link_url, art_data, context=context_html, summary_html=summary_html)
                     article_html = f"{meta_html}<hr/>{article_html}"
@@ -118,32 +129,20 @@ class RedditDriver(BaseDriver):
         if not options.no_comments:
             comments_listing = payload[1].get("data", {}).get("children", [])
             normalized = self._normalize_comments(comments_listing, options.max_depth)
+            if not options.no_images:
+                try:
+                    await self._embed_comment_images(session, normalized, source.url, assets, options)
+                except Exception as e:
+                    log.debug(f"Reddit comment image embed failed: {e}")
             enriched_roots = _enrich_comment_tree(normalized)
 
-            fmt = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
             chunks = []
             for comment in enriched_roots:
                 chunks.append("<div class='thread-container'>")
-                chunks.append(format_comment_html(comment, fmt))
+                chunks.append(format_comment_html(comment, _HTML_FMT))
                 chunks.append("</div>")
             comments_html = "".join(chunks)
 
-            if comments_html and not options.no_images:
-                try:
-                    com_soup = BeautifulSoup(comments_html, 'html.parser')
-                    for a in com_soup.find_all('a'):
-                        href = a.get('href')
-                        if href and re.search(r'\.(jpe?g|png|webp|gif)(\?|$)', href, re.IGNORECASE):
-                            # Skip non-file wiki pages masquerading with extensions
-                            if "://commons.wikimedia.org/wiki/" in href:
-                                continue
-                            img = com_soup.new_tag('img', src=href, alt=a.get_text(strip=True) or "Image")
-                            a.replace_with(img)
-                    await ImageProcessor.process_images(session, com_soup, source.url, assets, options=options)
-                    comments_html = com_soup.prettify()
-                except Exception as e:
-                    log.debug(f"Reddit comment image embed failed: {e}")
-
             if comments_html:
                 full_com_html = ArticleExtractor.build_article_html("Reddit Comments", comments_html)
                 com_chap = Chapter(title="Reddit Comments", filename="comments.xhtml", content_html=full_com_html, uid=f"reddit_com_{post_id}", is_comments=True)
@@ -170,30 +169,82 @@ class RedditDriver(BaseDriver):
         joiner = "&" if "?" in cleaned else "?"
         return f"{cleaned}.json{joiner}raw_json=1"
 
+    async def _embed_comment_images(self, session, roots, base_url, assets, options) -> None:
+        """Turn image links in comment bodies into embedded images.
+
+        Only comments that look like they reference an image are parsed. Their
+        fragments are gathered under one holder so a single image pass covers
+        the thread, then written back to each comment's ``text``.
+        """
+        holder = BeautifulSoup("<div></div>", HTML_PARSER)
+        container = holder.div
+        pending = []
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            stack.extend(node.get('children_data') or [])
+            text = node.get('text') or ""
+            if '<img' not in text and not ('<a' in text and _IMG_EXT_HINT_RE.search(text)):
+                continue
+            frag = BeautifulSoup(text, HTML_PARSER)
+            frag_body = frag.body if frag.body else frag
+            changed = frag_body.find('img') is not None
+            for a in frag_body.select(_IMG_LINK_SELECTOR):
+                href = a['href']
+                if _IMG_EXT_RE.search(href):
+                    # Skip non-file wiki pages masquerading with extensions
+                    if "://commons.wikimedia.org/wiki/" in href:
+                        continue
+                    img = holder.new_tag('img', src=href, alt=a.get_text(strip=True) or "Image")
+                    a.replace_with(img)
+                    changed = True
+            if not changed:
+                continue
+            wrapper = holder.new_tag('div')
+            for child in list(frag_body.contents):
+                wrapper.append(child)
+            container.append(wrapper)
+            pending.append((node, wrapper))
+
+        if not pending:
+            return
+        await ImageProcessor.process_images(session, container, base_url, assets, options=options)
+        for node, wrapper in pending:
+            node['text'] = wrapper.decode_contents()
+
     def _normalize_comments(self, children, max_depth, depth=0):
         if not children: return []
         results = []
-        for child in children:
+        # Iterative walk (see SubstackDriver._normalize_substack_tree): entries carry
+        # their depth and the list the normalized comment is appended to.
+        stack = [(child, depth, results) for child in reversed(children)]
+        # Hot loop on large threads: bind lookups to locals once.
+        pop, extend = stack.pop, stack.extend
+        unescape = html.unescape
+        while stack:
+            child, level, siblings = pop()
             if child.get("kind") != "t1": continue
+            if max_depth is not None and level >= max_depth: continue
             data = child.get("data", {})
-            if max_depth is not None and depth >= max_depth: continue
+            get = data.get
 
-            body_html = data.get("body_html") or ""
-            text = html.unescape(body_html) if body_html else "<p>[deleted]</p>"
-            author = data.get("author")
-            timestamp = data.get("created_utc") or 0
-            comment_id = data.get('id') or f"c_{abs(hash(text))}"
+            body_html = get("body_html")
+            text = unescape(body_html) if body_html else "<p>[deleted]</p>"
+            author = get("author")
+            comment_id = get('id')
+            if not comment_id:
+                comment_id = f"c_{abs(hash(text))}"
 
-            norm = {
+            kids = []
+            siblings.append({
                 'id': str(comment_id),
-                'by': f"u/{author}" if author else "[deleted]",
+                'by': "u/" + author if author else "[deleted]",
                 'text': text,
-                'time': timestamp,
-                'children_data': []
-            }
-            replies = data.get("replies")
+                'time': get("created_utc") or 0,
+                'children_data': kids
+            })
+            replies = get("replies")
             if isinstance(replies, dict):
-                rep_children = replies.get("data", {}).get("children", [])
-                norm['children_data'] = self._normalize_comments(rep_children, max_depth, depth + 1)
-            results.append(norm)
+                rep_children = replies.get("data", {}).get("children") or []
+                extend((rep, level + 1, kids) for rep in reversed(rep_children))
         return results
@@ -1,23 +1,88 @@
 import json
 import re
 import asyncio
-import random
+import time
+from functools import lru_cache
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from ebooklib import epub
-from pygments.formatters import HtmlFormatter
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple, Any
 
 from .base import BaseDriver
 from ..models import (
-    log, BookData, ConversionContext, Source, Chapter
+    log, BookData, ConversionContext, Source, Chapter, HTML_PARSER, json_loads
 )
 from ..core.extractor import ArticleExtractor
 from ..core.image_processor import ImageProcessor
 from ..core.session import fetch_with_retry
 from ..utils.llm import LLMHelper
-from ..utils.formatting import _enrich_comment_tree, format_comment_html
+from ..utils.formatting import _enrich_comment_tree, format_comment_html, _HTML_FMT
+
+_PRELOADS_ANCHOR = "window._preloads"
+_PRELOADS_CALL_RE = re.compile(r'\s*=\s*JSON\.parse\(\s*')
+_PRELOADS_RE = re.compile(r'window\._preloads\s*=\s*JSON\.parse\((["\'].*?["\'])\)', re.DOTALL)
+_SLUG_RE = re.compile(r'/(?:p|in)/([^/]+)')
+_JSON_DECODER = json.JSONDecoder()
+
+# Comment pagination pacing: a small floor between pages, and a longer pause only
+# when the API reports it is close to its rate limit or answers 429.
+_COMMENT_PAGE_MIN_DELAY = 0.05
+_RATELIMIT_LOW_WATER = 5
+_MAX_RATELIMIT_RETRIES = 3
+# Longest single pause a rate-limit header may impose.
+_MAX_RATELIMIT_DELAY = 60.0
+
+def _header_wait(value) -> float:
+    """Seconds to wait for a header value given as a delta or an epoch timestamp."""
+    wait = float(value)
+    now = time.time()
+    if wait > now:
+        wait -= now
+    return min(max(wait, 0.0), _MAX_RATELIMIT_DELAY)
+
+def _ratelimit_delay(headers) -> float:
+    """Seconds to wait before the next comment page, from rate-limit headers."""
+    try:
+        remaining = int(headers.get("x-ratelimit-remaining"))
+    except (TypeError, ValueError):
+        return 0.0
+    if remaining >= _RATELIMIT_LOW_WATER:
+        return 0.0
+    try:
+        return _header_wait(headers.get("x-ratelimit-reset"))
+    except (TypeError, ValueError):
+        return (_RATELIMIT_LOW_WATER - remaining) * 0.25
+
+def _retry_after_delay(headers, attempt: int) -> float:
+    try:
+        return _header_wait(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return 2.0 ** attempt
+
+def _extract_preloads(html: str) -> Optional[Dict[str, Any]]:
+    # Find the literal anchor and decode the JSON string argument in place; the
+    # DOTALL regex is only a fallback for single-quoted legacy layouts.
+    idx = html.find(_PRELOADS_ANCHOR)
+    if idx == -1:
+        return None
+    call = _PRELOADS_CALL_RE.match(html, idx + len(_PRELOADS_ANCHOR))
+    if call and html.startswith('"', call.end()):
+        inner, _ = _JSON_DECODER.raw_decode(html, call.end())
+        return json_loads(inner)
+    match = _PRELOADS_RE.search(html, idx)
+    if not match:
+        return None
+    return json_loads(json_loads(match.group(1)))
+
+@lru_cache(maxsize=4096)
+def _iso_to_unix(iso_str: Optional[str]) -> float:
+    # Large threads repeat the same timestamps, so parsed values are cached by string.
+    if not iso_str: return 0
+    try:
+        dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
+        return dt.timestamp()
+    except: return 0
 
 class SubstackDriver(BaseDriver):
     async def prepare_book_data(self, context: ConversionContext, source: Source) -> Optional[BookData]:
@@ -40,7 +105,7 @@ class SubstackDriver(BaseDriver):
             return None
 
         raw_html = data.get('raw_html_for_metadata') or data.get('html', '')
-        soup = BeautifulSoup(data['html'], 'html.parser')
+        soup = BeautifulSoup(data['html'], HTML_PARSER)
         post_id, pub_id, subdomain = self._extract_all_metadata(soup, raw_html)
 
         if not post_id:
@@ -69,7 +134,7 @@ class SubstackDriver(BaseDriver):
             summary_html = await LLMHelper.generate_summary(text_content, options.llm_model, options.llm_api_key, options.llm_provider)
 
         title = data['title'] or "Substack Article"
-        chapter_html = body_soup.prettify()
+        chapter_html = body_soup.decode_contents()
         meta_html = ArticleExtractor.build_meta_block(url, data, summary_html=summary_html)
 
         chapters = []
@@ -96,12 +161,11 @@ class SubstackDriver(BaseDriver):
             if raw_comments:
                 raw_nodes = self._normalize_substack_tree(raw_comments)
                 enriched_roots = _enrich_comment_tree(raw_nodes)
-                fmt = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
 
                 chunks = []
                 for i, comment in enumerate(enriched_roots):
                     chunks.append(f"<div class='thread-container'>")
-                    chunks.append(format_comment_html(comment, fmt))
+                    chunks.append(format_comment_html(comment, _HTML_FMT))
                     chunks.append("</div>")
 
                 comments_html = "".join(chunks)
@@ -130,12 +194,8 @@ class SubstackDriver(BaseDriver):
     def _extract_all_metadata(self, soup, html) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         post_id, pub_id, subdomain = None, None, None
         try:
-            pattern = r'window\._preloads\s*=\s*JSON\.parse\((["\'].*?["\'])\)'
-            match = re.search(pattern, html, re.DOTALL)
-            if match:
-                import json
-                inner = json.loads(match.group(1))
-                data = json.loads(inner)
+            data = _extract_preloads(html)
+            if data:
                 if 'post' in data: post_id = str(data['post'].get('id'))
                 if 'pub' in data:
                     pub_id = str(data['pub'].get('id'))
@@ -144,23 +204,30 @@ class SubstackDriver(BaseDriver):
                     pub_id = str(data['publication'].get('id'))
                     subdomain = data['publication'].get('subdomain')
         except Exception: pass
+        if post_id and pub_id and subdomain:
+            return post_id, pub_id, subdomain
+        # Index meta tags in one pass; the first tag for each name/property wins, as with find().
+        by_name, by_prop = {}, {}
+        for m in soup.find_all("meta"):
+            name = m.get("name")
+            if name: by_name.setdefault(name, m.get("content"))
+            prop = m.get("property")
+            if prop: by_prop.setdefault(prop, m.get("content"))
         if not post_id:
-            m = soup.find("meta", attrs={"name": "substack:post_id"})
-            if m: post_id = m.get("content")
+            post_id = by_name.get("substack:post_id")
         if not pub_id:
-            m = soup.find("meta", attrs={"name": "substack:publication_id"})
-            if m: pub_id = m.get("content")
+            pub_id = by_name.get("substack:publication_id")
         if not subdomain:
-             og = soup.find("meta", attrs={"property": "og:url"})
-             if og and "substack.com" in str(og.get("content")):
-                 p = urlparse(og.get("content"))
+             og_url = by_prop.get("og:url")
+             if og_url and "substack.com" in str(og_url):
+                 p = urlparse(og_url)
                  parts = p.netloc.split('.')
                  if len(parts) >= 3: subdomain = parts[0]
         return post_id, pub_id, subdomain
 
     async def _fetch_ids_from_slug(self, url, base_url, session) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         path = urlparse(url).path
-        match = re.search(r'/(?:p|in)/([^/]+)', path)
+        match = _SLUG_RE.search(path)
         if not match: return None, None, None
         slug = match.group(1)
         api_url = f"{base_url}/api/v1/posts/{slug}"
@@ -182,33 +249,41 @@ class SubstackDriver(BaseDriver):
         }
         if pub_id: headers["x-pub-context"] = str(pub_id)
 
-        active_endpoint = None
+        async def probe(ep):
+            # The context manager releases each probe's connection back to the pool.
+            async with session.get(f"{base_url}{ep}?limit=1&sort=new", headers=headers) as resp:
+                return resp.status == 200
+
+        # Probe all candidate endpoints at once; the first one (in preference order) to answer 200 wins.
         candidates = [f"/api/v1/posts/{post_id}/comments", f"/api/v1/post/{post_id}/comments"]
-        for ep in candidates:
-             try:
-                test_url = f"{base_url}{ep}?limit=1&sort=new"
-                async with session.get(test_url, headers=headers) as resp:
-                    if resp.status == 200:
-                        active_endpoint = ep
-                        log.info(f"Found valid endpoint: {ep}")
-                        break
-             except: pass
+        results = await asyncio.gather(*(probe(ep) for ep in candidates), return_exceptions=True)
+        active_endpoint = next((ep for ep, ok in zip(candidates, results) if ok is True), None)
 
         if not active_endpoint: return None
+        log.info(f"Found valid endpoint: {active_endpoint}")
         api_url = f"{base_url}{active_endpoint}"
 
+        delay = 0.0
+        throttled = 0
         while True:
             try:
-                await asyncio.sleep(random.uniform(0.5, 1.0))
+                await asyncio.sleep(max(delay, _COMMENT_PAGE_MIN_DELAY))
                 full_url = f"{api_url}?limit=50&offset={offset}&sort=new"
                 async with session.get(full_url, headers=headers) as response:
                     if response.status == 404: return None
+                    if response.status == 429 and throttled < _MAX_RATELIMIT_RETRIES:
+                        delay = _retry_after_delay(response.headers, throttled)
+                        throttled += 1
+                        log.debug(f"Comment API throttled; retrying in {delay:.2f}s")
+                        continue
                     if response.status != 200:
                         log.debug(f"API Status {response.status}")
                         break
                     ctype = response.headers.get("Content-Type", "")
                     if "application/json" not in ctype: break
-                    data = await response.json()
+                    data = json_loads(await response.read())
+                    delay = _ratelimit_delay(response.headers)
+                    throttled = 0
                 if not data or 'comments' not in data: break
                 batch = data['comments']
                 if not batch: break
@@ -221,8 +296,12 @@ class SubstackDriver(BaseDriver):
     def _normalize_substack_tree(self, raw_roots):
         normalized = []
         count = 0
-        def recurse(node):
-            nonlocal count
+        # Walk with an explicit stack so deep reply chains can't hit the recursion limit.
+        # Each entry carries the list its normalized node belongs in; children are
+        # pushed in reverse so siblings keep their original order.
+        stack = [(root, normalized) for root in reversed(raw_roots)]
+        while stack:
+            node, siblings = stack.pop()
             count += 1
             text = node.get('body_html') or node.get('body') or ""
             author = node.get('name')
@@ -234,22 +313,12 @@ class SubstackDriver(BaseDriver):
                 'id': str(node.get('id')),
                 'by': author,
                 'text': text,
-                'time': self._iso_to_unix(node.get('date')),
+                'time': _iso_to_unix(node.get('date')),
                 'children_data': []
             }
-            if 'children' in node and isinstance(node['children'], list):
-                for child in node['children']:
-                    norm_node['children_data'].append(recurse(child))
-            return norm_node
-
-        for root in raw_roots:
-            normalized.append(recurse(root))
+            siblings.append(norm_node)
+            children = node.get('children')
+            if isinstance(children, list):
+                stack.extend((child, norm_node['children_data']) for child in reversed(children))
         log.info(f"Deep search found {count} total comments (including replies).")
         return normalized
-
-    def _iso_to_unix(self, iso_str):
-        if not iso_str: return 0
-        try:
-            dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
-            return dt.timestamp()
-        except: return 0
@@ -2,7 +2,6 @@ import re
 
 from bs4 import BeautifulSoup
 from ebooklib import epub
-from pygments.formatters import HtmlFormatter
 from typing import List, Dict, Optional
 
 from .base import BaseDriver
@@ -12,7 +11,7 @@ from ..models import (
 from ..core.extractor import ArticleExtractor
 from ..core.image_processor import ImageProcessor
 from ..utils.llm import LLMHelper
-from ..utils.formatting import _enrich_comment_tree, format_comment_html
+from ..utils.formatting import _enrich_comment_tree, format_comment_html, _HTML_FMT
 
 class WordPressDriver(BaseDriver):
     @staticmethod
@@ -102,7 +101,7 @@ class WordPressDriver(BaseDriver):
             summary_html = await LLMHelper.generate_summary(text_content, options.llm_model, options.llm_api_key, options.llm_provider)
 
         article_body = self._clean_article_body(body_soup, title)
-        chapter_html = article_body.prettify()
+        chapter_html = str(article_body)
         meta_html = ArticleExtractor.build_meta_block(url, data, summary_html=summary_html)
         final_art_html = ArticleExtractor.build_article_html(title, chapter_html, meta_html=meta_html, include_hr=True)
         
@@ -119,11 +118,10 @@ class WordPressDriver(BaseDriver):
                 if comment_list:
                     comments = self._parse_comments(comment_list)
                     enriched = _enrich_comment_tree(comments)
-                    fmt = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
                     chunks = []
                     for c in enriched:
                         chunks.append("<div class='thread-container'>")
-                        chunks.append(format_comment_html(c, fmt))
+                        chunks.append(format_comment_html(c, _HTML_FMT))
                         chunks.append("</div>")
                     comments_html = "".join(chunks)
 
@@ -27,8 +27,7 @@ from ..core.profiles import ProfileManager
 from ..core.session import fetch_with_retry
 from ..core.translation import comparable_language, normalize_translation_display
 from ..utils.llm import LLMHelper
-from ..utils.formatting import _enrich_comment_tree, format_comment_html
-from pygments.formatters import HtmlFormatter
+from ..utils.formatting import _enrich_comment_tree, format_comment_html, _HTML_FMT
 
 class YouTubeDriver(BaseDriver):
     async def prepare_book_data(self, context: ConversionContext, source: Source) -> Optional[BookData]:
@@ -311,11 +310,10 @@ class YouTubeDriver(BaseDriver):
                 enriched_roots = await loop.run_in_executor(None, _fetch_yt_comments)
                 if enriched_roots:
                     _enrich_comment_tree(enriched_roots)
-                    fmt = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
                     comment_chunks = []
                     for comment in enriched_roots:
                         comment_chunks.append(f"<div class='thread-container'>")
-                        comment_chunks.append(format_comment_html(comment, fmt))
+                        comment_chunks.append(format_comment_html(comment, _HTML_FMT))
                         comment_chunks.append("</div>")
                     
                     full_com_html = ArticleExtractor.build_article_html("YouTube Comments", "".join(comment_chunks))
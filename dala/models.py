@@ -1,5 +1,6 @@
 import os
 import re
+import json
 import asyncio
 import aiohttp
 import logging
@@ -9,6 +10,18 @@ from typing import List, Dict, Optional, Any, Tuple
 from urllib.parse import parse_qs, unquote, urlparse
 from bs4 import BeautifulSoup
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover - lxml is a declared dependency
+    HTML_PARSER = "html.parser"
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # optional: install dala[speedups]
+    json_loads = json.loads
+
 # --- Constants ---
 HN_API_BASE_URL = "https://hacker-news.firebaseio.com/v0/"
 HN_ITEM_URL_BASE = "https://news.ycombinator.com/item?id="
@@ -1,61 +1,117 @@
 import asyncio
 from bs4 import BeautifulSoup
 from pygments import highlight
+from pygments.formatters import HtmlFormatter
 from pygments.lexers import guess_lexer
 from typing import List, Dict, Optional
 
-from ..models import log, HN_API_BASE_URL
+from ..models import log, HN_API_BASE_URL, HTML_PARSER
 from ..core.session import fetch_with_retry
 
+# Concurrent HN item requests while walking a comment tree.
+_HN_COMMENT_WORKERS = 32
+
+# Shared by every driver that renders comment threads; building a formatter loads its style map.
+_HTML_FMT = HtmlFormatter(style='default', cssclass='codehilite', noclasses=False)
+
+def _comment_style(depth: int) -> str:
+    if depth == 0: return "margin-bottom: 20px;"
+    margin = min(depth, 5) * 10
+    padding = 10 if depth < 6 else 2
+    return f"border-left: 2px solid #ccc; padding-left: {padding}px; margin-left: {margin}px; margin-bottom: 15px;"
+
+# Indentation stops changing at depth 6, so every deeper comment shares that style.
+_COMMENT_STYLE_MAX_DEPTH = 6
+_COMMENT_STYLES = tuple(_comment_style(d) for d in range(_COMMENT_STYLE_MAX_DEPTH + 1))
+
 def _enrich_comment_tree(roots: List[Dict]) -> List[Dict]:
     """Pre-calculate parent/sibling/root IDs for EPUB navigation buttons."""
     if not roots: return []
+    root_sids = [str(root.get('id')) for root in roots]
     for i in range(len(roots) - 1):
-        roots[i]['next_root_id'] = str(roots[i+1].get('id'))
-    def recurse(nodes, parent_id, root_id, next_root_id):
+        roots[i]['next_root_id'] = root_sids[i+1]
+    # Explicit stack of (siblings, parent_id, root_id, next_root_id); each
+    # level's ids are stringified once and reused for sibling and parent links.
+    stack = []
+    for root, root_sid in zip(roots, root_sids):
+        if root.get('children_data'):
+            stack.append((root['children_data'], root_sid, root_sid, root.get('next_root_id')))
+    while stack:
+        nodes, parent_id, root_id, next_root_id = stack.pop()
+        sids = [str(node.get('id')) for node in nodes]
+        last = len(nodes) - 1
         for i, node in enumerate(nodes):
             node['parent_id'] = parent_id
             node['root_id'] = root_id
             node['next_root_id'] = next_root_id
-            if i < len(nodes) - 1:
-                node['next_sibling_id'] = str(nodes[i+1].get('id'))
-            if node.get('children_data'):
-                recurse(node['children_data'], str(node.get('id')), root_id or str(node.get('id')), next_root_id)
-    for root in roots:
-        next_r = root.get('next_root_id')
-        if root.get('children_data'):
-             recurse(root['children_data'], str(root.get('id')), str(root.get('id')), next_r)
+            if i < last:
+                node['next_sibling_id'] = sids[i+1]
+            children = node.get('children_data')
+            if children:
+                stack.append((children, sids[i], root_id, next_root_id))
     return roots
 
 async def fetch_comments_recursive(session, comment_ids, fetched_data, max_depth, current_depth=0):
+    """Fetch an HN comment tree and return the live top-level comments.
+
+    Items are fetched breadth-first by a fixed pool of workers draining one
+    queue, so replies start downloading as soon as their parent arrives rather
+    than after the whole level. The tree is then assembled from
+    ``fetched_data`` in each parent's ``kids`` order.
+    """
     if not comment_ids or (max_depth is not None and current_depth >= max_depth): return []
-    tasks = []
-    valid_ids = [cid for cid in comment_ids if cid not in fetched_data]
-    for cid in valid_ids:
-        url = f"{HN_API_BASE_URL}item/{cid}.json"
-        tasks.append(fetch_with_retry(session, url))
-    if not tasks: return []
-    results = await asyncio.gather(*tasks)
-    child_tasks = []
-    comments = []
-    for i, (data, _) in enumerate(results):
-        if not data: continue
-        cid = valid_ids[i]
-        fetched_data[cid] = data
-        if not data.get('deleted') and not data.get('dead'):
-            data['children_data'] = []
-            data['id'] = str(data.get('id'))
-            comments.append(data)
-            if data.get('kids'):
-                t = fetch_comments_recursive(session, data['kids'], fetched_data, max_depth, current_depth + 1)
-                child_tasks.append((data, t))
-    if child_tasks:
-        res = await asyncio.gather(*(t[1] for t in child_tasks))
-        for i, (parent, _) in enumerate(child_tasks):
-            parent['children_data'] = res[i]
-    return comments
+    root_ids = [cid for cid in comment_ids if cid not in fetched_data]
+    if not root_ids: return []
 
-def format_comment_html(comment_data, formatter, depth=0):
+    queue: asyncio.Queue = asyncio.Queue()
+    claimed = set(fetched_data)
+    child_ids: Dict = {}
+    order = []
+
+    def enqueue(ids, depth):
+        taken = []
+        for cid in ids:
+            if cid in claimed: continue
+            claimed.add(cid)
+            taken.append(cid)
+            queue.put_nowait((cid, depth))
+        return taken
+
+    async def worker():
+        while True:
+            cid, depth = await queue.get()
+            try:
+                data, _ = await fetch_with_retry(session, f"{HN_API_BASE_URL}item/{cid}.json")
+                if not data: continue
+                fetched_data[cid] = data
+                order.append(cid)
+                if data.get('deleted') or data.get('dead'): continue
+                if data.get('kids') and (max_depth is None or depth + 1 < max_depth):
+                    child_ids[cid] = enqueue(data['kids'], depth + 1)
+            finally:
+                queue.task_done()
+
+    root_ids = enqueue(root_ids, current_depth)
+    workers = [asyncio.create_task(worker()) for _ in range(_HN_COMMENT_WORKERS)]
+    try:
+        await queue.join()
+    finally:
+        for w in workers: w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def live(cid):
+        data = fetched_data.get(cid)
+        if not data or data.get('deleted') or data.get('dead'): return None
+        return data
+
+    for cid in order:
+        data = live(cid)
+        if data is None: continue
+        data['id'] = str(data.get('id'))
+        data['children_data'] = [c for c in map(live, child_ids.get(cid, ())) if c is not None]
+    return [c for c in map(live, root_ids) if c is not None]
+
+def _comment_open_html(comment_data, formatter, depth):
     auth = comment_data.get('by', '[deleted]')
     text = comment_data.get('text', '')
     cid = comment_data.get('id')
@@ -72,27 +128,45 @@ def format_comment_html(comment_data, formatter, depth=0):
     nav_bar = f'<div class="nav-bar">{"".join(btns)}</div>'
 
     if '<pre>' in text:
-        soup = BeautifulSoup(text, 'html.parser')
-        for pre in soup.find_all('pre'):
+        soup = BeautifulSoup(text, HTML_PARSER)
+        body = soup.body if soup.body else soup
+        # Highlighted blocks are spliced into the serialized text through
+        # placeholders, so Pygments output is never parsed again.
+        highlighted = {}
+        for pre in body.find_all('pre'):
             try:
                 code = pre.get_text()
                 lexer = guess_lexer(code)
-                hl = highlight(code, lexer, formatter)
-                pre.replace_with(BeautifulSoup(hl, 'html.parser'))
+                marker = f"\x00pre{len(highlighted)}\x00"
+                highlighted[marker] = highlight(code, lexer, formatter)
+                pre.replace_with(marker)
             except: pass
-        text = str(soup)
+        text = body.decode_contents()
+        for marker, hl in highlighted.items():
+            text = text.replace(marker, hl, 1)
 
-    capped_depth = min(depth, 5)
-    margin = capped_depth * 10
-    border_style = f"border-left: 2px solid #ccc;" if depth > 0 else ""
-    padding = 10 if depth < 6 else 2
-    style = f"{border_style} padding-left: {padding}px; margin-left: {margin}px; margin-bottom: 15px;"
-    if depth == 0: style = "margin-bottom: 20px;"
+    style = _COMMENT_STYLES[min(depth, _COMMENT_STYLE_MAX_DEPTH)]
 
     header = f'<div class="comment-header"><div class="comment-author"><div class="comment-author-inner">{auth}</div></div><div class="nav-bar">{nav_bar}</div></div>'
-    html = f'<div id="c_{cid}" style="{style}">{header}<div class="comment-body">{text}</div>'
-    if comment_data.get('children_data'):
-        for child in comment_data['children_data']:
-            html += format_comment_html(child, formatter, depth + 1)
-    html += '</div>'
-    return html
+    return f'<div id="c_{cid}" style="{style}">{header}<div class="comment-body">{text}</div>'
+
+def format_comment_html(comment_data, formatter, depth=0):
+    """Render a comment and its replies as nested divs.
+
+    Walks the tree with an explicit stack so deep threads neither recurse nor
+    rebuild the output string; a ``None`` entry closes the div of the comment
+    pushed just before its replies.
+    """
+    out = []
+    stack = [(comment_data, depth)]
+    while stack:
+        node, level = stack.pop()
+        if node is None:
+            out.append('</div>')
+            continue
+        out.append(_comment_open_html(node, formatter, level))
+        stack.append((None, level))
+        children = node.get('children_data')
+        if children:
+            stack.extend((child, level + 1) for child in reversed(children))
+    return "".join(out)
@@ -14,6 +14,7 @@ from dala.core.extractor import ArticleExtractor
 from dala.core.image_processor import ImageProcessor
 from dala.drivers.forum import ForumDriver
 from dala.drivers.generic import GenericDriver
+from dala.drivers.substack import SubstackDriver
 from dala.drivers.wordpress import WordPressDriver
 from dala.drivers.youtube import YouTubeDriver
 from dala.models import ARCHIVE_ORG_API_BASE, ConversionContext, ConversionOptions, ImageAsset, Source
@@ -38,6 +39,7 @@ async def test_generic_driver_fetch_success():
             assert book is not None
             assert book.title == "Test Article"
             assert "Some content" in book.chapters[0].content_html
+            assert book.chapters[0].content_html.count("<body") == 1
             assert book.source_url == url
 
 
@@ -661,6 +663,52 @@ async def test_forum_driver_advances_through_browser_fetched_pages_without_next_
     assert "Second page body." in html
 
 
+@pytest.mark.asyncio
+async def test_forum_driver_seeds_preloaded_assets_with_unique_filenames(monkeypatch):
+    from dala.core.image_processor import ForumImageProcessor
+
+    url = "https://www.mtbr.com/threads/example.123/"
+    forum_html = """
+    <html><head><title>Seeded Forum</title></head>
+    <body>
+        <article class="message message--post" id="post-1" data-author="Poster">
+            <div class="message-content"><div class="bbWrapper">
+                <img src="https://www.mtbr.com/attachments/photo-jpg.1/">
+                <img src="https://www.mtbr.com/attachments/photo-jpg.2/">
+            </div></div>
+        </article>
+    </body></html>
+    """
+    raw_a = base64.b64encode(b"first-image-bytes").decode()
+    raw_b = base64.b64encode(b"second-image-bytes").decode()
+
+    async def fake_fetch(*args, **kwargs):
+        raise AssertionError("preloaded attachments should not be fetched")
+
+    monkeypatch.setattr(ForumImageProcessor, "fetch_image_data", fake_fetch)
+
+    async with aiohttp.ClientSession() as session:
+        context = ConversionContext(session=session, options=ConversionOptions())
+        source = Source(
+            url=url,
+            html=forum_html,
+            assets=[
+                {"original_url": "https://www.mtbr.com/attachments/photo-jpg.1/", "content": raw_a, "content_type": "image/jpeg"},
+                {"original_url": "https://www.mtbr.com/attachments/photo-jpg.2/", "content": raw_b, "content_type": "image/jpeg"},
+            ],
+        )
+        book = await ForumDriver().prepare_book_data(context, source)
+
+    assert book is not None
+    filenames = [img.filename for img in book.images]
+    assert len(filenames) == 2
+    assert len(set(filenames)) == 2
+    assert len({img.uid for img in book.images}) == 2
+    html = book.chapters[0].content_html
+    for name in filenames:
+        assert name in html
+
+
 @pytest.mark.asyncio
 async def test_forum_image_processor_drops_chrome_images_and_skips_non_attachment_fetch(monkeypatch):
     from dala.core.image_processor import ForumImageProcessor
@@ -696,6 +744,83 @@ async def test_forum_image_processor_drops_chrome_images_and_skips_non_attachmen
     assert soup.find("img") is None
 
 
+@pytest.mark.asyncio
+async def test_forum_image_processor_uses_enclosing_attachment_link(monkeypatch):
+    from dala.core.image_processor import ForumImageProcessor
+
+    soup = BeautifulSoup(
+        """
+        <html><body>
+          <a href="/attachments/photo-jpg.4567/"><span><img src="https://cdn.example.com/pixel.gif" data-src="/data/thumb/photo.jpg"></span></a>
+          <img src="/attachments/loose-jpg.890/">
+        </body></html>
+        """,
+        "html.parser",
+    )
+    calls = []
+
+    async def fake_fetch(session, url, referer=None, viewer_url=None):
+        calls.append((url, viewer_url))
+        return None, None, "skip"
+
+    monkeypatch.setattr(ForumImageProcessor, "fetch_image_data", fake_fetch)
+
+    async with aiohttp.ClientSession() as session:
+        await ForumImageProcessor.process_images(
+            session,
+            soup,
+            "https://forum.example.com/threads/example.123/",
+            [],
+            preloaded_assets=[],
+            options=ConversionOptions(),
+        )
+
+    assert sorted(calls) == [
+        ("https://forum.example.com/attachments/loose-jpg.890/", "https://forum.example.com/attachments/loose-jpg.890/"),
+        ("https://forum.example.com/attachments/photo-jpg.4567/", "https://forum.example.com/attachments/photo-jpg.4567/"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_forum_image_processor_flattens_media_and_skips_sourceless_images(monkeypatch, caplog):
+    from dala.core.image_processor import ForumImageProcessor
+
+    soup = BeautifulSoup(
+        """
+        <html><body>
+          <picture><source srcset="/a.webp"><img src="https://images.platforum.cloud/logos/site.svg"></picture>
+          <picture><source srcset="/b.webp"></picture>
+          <iframe src="https://www.youtube.com/embed/abc"></iframe>
+          <img alt="placeholder without source">
+        </body></html>
+        """,
+        "html.parser",
+    )
+
+    async def fake_fetch(*args, **kwargs):
+        raise AssertionError("nothing here should be fetched")
+
+    monkeypatch.setattr(ForumImageProcessor, "fetch_image_data", fake_fetch)
+
+    async with aiohttp.ClientSession() as session:
+        with caplog.at_level(logging.INFO):
+            await ForumImageProcessor.process_images(
+                session,
+                soup,
+                "https://forum.example.com/threads/example.123/",
+                [],
+                preloaded_assets=[],
+                options=ConversionOptions(),
+            )
+
+    assert soup.find("picture") is None
+    assert soup.find("source") is None
+    assert soup.find("iframe") is None
+    assert soup.find("a", href="https://www.youtube.com/embed/abc") is not None
+    assert [img.get("alt") for img in soup.find_all("img")] == ["placeholder without source"]
+    assert "images=1 " in caplog.text
+
+
 @pytest.mark.asyncio
 async def test_forum_image_fetch_dedupes_attachment_targets(monkeypatch):
     from dala.core.image_processor import ForumImageProcessor
@@ -1519,3 +1644,114 @@ async def test_image_processor_prefers_lazy_source_over_blur_preview(monkeypatch
     assert assets[0].original_url == seen[0]
     assert "Lawrence Hargrave with kites." in str(soup)
     assert "data-blursrc" not in str(soup)
+
+
+@pytest.mark.asyncio
+async def test_substack_fetch_comments_uses_first_working_endpoint():
+    base = "https://example.substack.com"
+    with aioresponses() as m:
+        m.get(f"{base}/api/v1/posts/42/comments?limit=1&sort=new", status=404)
+        m.get(f"{base}/api/v1/post/42/comments?limit=1&sort=new", status=200, payload={"comments": []})
+        m.get(
+            f"{base}/api/v1/post/42/comments?limit=50&offset=0&sort=new",
+            status=200,
+            payload={"comments": [{"id": 1}], "has_more": False},
+        )
+
+        async with aiohttp.ClientSession() as session:
+            comments = await SubstackDriver()._fetch_comments(base, "42", None, session)
+
+    assert comments == [{"id": 1}]
+
+
+@pytest.mark.asyncio
+async def test_forum_driver_prefetches_bounded_pages_concurrently(monkeypatch):
+    url = "https://forum.example.com/threads/topic.1/"
+    in_flight = {"now": 0, "max": 0}
+
+    async def fake_fetch(session, target_url, response_type="text", **kwargs):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        page = target_url.rstrip("/").rsplit("page-", 1)[-1] if "page-" in target_url else "1"
+        html = f"""
+        <html><head><title>Topic</title></head><body>
+        <article class="message message--post" id="post-{page}" data-author="User{page}">
+            <div class="message-content"><div class="bbWrapper">Body {page}.</div></div>
+        </article>
+        </body></html>
+        """
+        return html, target_url
+
+    monkeypatch.setattr("dala.drivers.forum.fetch_with_retry", fake_fetch)
+
+    async with aiohttp.ClientSession() as session:
+        options = ConversionOptions(page_spec=[1, 2, 3], no_images=True)
+        context = ConversionContext(session=session, options=options)
+        book = await ForumDriver().prepare_book_data(context, Source(url=url))
+
+    html = book.chapters[0].content_html
+    assert in_flight["max"] == 3
+    assert html.index("Body 1.") < html.index("Body 2.") < html.index("Body 3.")
+
+
+@pytest.mark.asyncio
+async def test_forum_driver_max_pages_only_looks_a_little_ahead(monkeypatch):
+    url = "https://forum.example.com/threads/topic.1/"
+    fetched = []
+    parsed = []
+
+    async def fake_fetch(session, target_url, response_type="text", **kwargs):
+        fetched.append(target_url)
+        page = int(target_url.rstrip("/").rsplit("page-", 1)[-1]) if "page-" in target_url else 1
+        next_link = '<a rel="next" href="/threads/topic.1/page-2">Next</a>' if page == 1 else ""
+        html = f"""
+        <html><head><title>Topic</title></head><body>
+        <article class="message message--post" id="post-{page}" data-author="User{page}">
+            <div class="message-content"><div class="bbWrapper">Body {page}.</div></div>
+        </article>
+        {next_link}
+        </body></html>
+        """
+        return html, target_url
+
+    def counting_soup(markup, *args, **kwargs):
+        if "<article" in str(markup):
+            parsed.append(markup)
+        return BeautifulSoup(markup, *args, **kwargs)
+
+    monkeypatch.setattr("dala.drivers.forum.fetch_with_retry", fake_fetch)
+    monkeypatch.setattr("dala.drivers.forum.BeautifulSoup", counting_soup)
+
+    async with aiohttp.ClientSession() as session:
+        options = ConversionOptions(max_pages=20, no_images=True)
+        context = ConversionContext(session=session, options=options)
+        book = await ForumDriver().prepare_book_data(context, Source(url=url))
+
+    html = book.chapters[0].content_html
+    assert html.index("Body 1.") < html.index("Body 2.")
+    assert "Body 3." not in html
+    assert len(fetched) <= 3
+    assert len(parsed) == 2
+
+
+@pytest.mark.asyncio
+async def test_substack_fetch_comments_retries_after_429():
+    base = "https://example.substack.com"
+    page_url = f"{base}/api/v1/posts/42/comments?limit=50&offset=0&sort=new"
+    with aioresponses() as m:
+        m.get(f"{base}/api/v1/posts/42/comments?limit=1&sort=new", status=200, payload={"comments": []})
+        m.get(f"{base}/api/v1/post/42/comments?limit=1&sort=new", status=404)
+        m.get(page_url, status=429, headers={"Retry-After": "0"})
+        m.get(page_url, status=200, payload={"comments": [{"id": 1}], "has_more": True}, headers={"x-ratelimit-remaining": "50"})
+        m.get(
+            f"{base}/api/v1/posts/42/comments?limit=50&offset=1&sort=new",
+            status=200,
+            payload={"comments": [{"id": 2}], "has_more": False},
+        )
+
+        async with aiohttp.ClientSession() as session:
+            comments = await SubstackDriver()._fetch_comments(base, "42", None, session)
+
+    assert comments == [{"id": 1}, {"id": 2}]
@@ -1,3 +1,5 @@
+import hashlib
+
 import pytest
 
 import dala.cli as main
@@ -60,6 +62,17 @@ def test_prepare_books_for_bundle_dedupes_identical_image_content():
     assert 'src="images/hero.jpg"' in books[1].chapters[0].content_html
 
 
+def test_prepare_books_for_bundle_rekeys_colliding_image_uids():
+    first, second = _book("one", b"first"), _book("two", b"second")
+    first.images[0].uid = second.images[0].uid = "img_0"
+
+    books, _ = prepare_books_for_bundle([first, second])
+
+    uids = [img.uid for book in books for img in book.images]
+    assert uids[0] == "img_0"
+    assert len(set(uids)) == 2
+
+
 def test_create_bundle_uses_prepared_image_refs():
     bundle = main.create_bundle([
         _book("one", b"first"),
@@ -72,6 +85,17 @@ def test_create_bundle_uses_prepared_image_refs():
     assert all(any(name in chapter.content_html for chapter in bundle.chapters) for name in filenames)
 
 
+def test_create_bundle_prefixes_chapter_filenames_with_stable_source_digest():
+    bundle = main.create_bundle([
+        _book("one", b"first"),
+        _book("two", b"second"),
+    ], "Bundle", "Author")
+
+    filenames = [chapter.filename for chapter in bundle.chapters]
+    assert filenames[0] == f"doc_{hashlib.blake2b(b'one', digest_size=6).hexdigest()}_index.xhtml"
+    assert len(set(filenames)) == 2
+
+
 def test_create_bundle_prefixes_toc_entries_with_published_date():
     book = _book("one", b"first")
     book.title = "Article One"
@@ -1,18 +1,24 @@
+import asyncio
 import builtins
+import json
 import pytest
 from bs4 import BeautifulSoup
 import dala.cli as main
 from dala.core.dispatcher import DriverDispatcher
 from dala.core.extractor import ArticleExtractor
+from dala.core.forum_image_processor import AssetStore
 from dala.core.image_processor import BaseImageProcessor, ForumImageProcessor, ImageProcessor
 from dala.core.browser import BrowserFetchError, BrowserFetchOptions, BrowserFetchResult
 from dala.core.profiles import ProfileManager
+from dala.core.session import get_session, session_with_cookies
 from dala.core.writer import apply_saved_metadata_to_book, format_saved_metadata
 from dala.drivers.forum import ForumDriver
 from dala.drivers.generic import GenericDriver
 from dala.drivers.hn import HackerNewsDriver
-from dala.drivers.substack import SubstackDriver
+from dala.drivers.reddit import RedditDriver
+from dala.drivers.substack import SubstackDriver, _ratelimit_delay, _retry_after_delay
 from dala.drivers.youtube import YouTubeDriver
+from dala.utils.formatting import _HTML_FMT, _enrich_comment_tree, fetch_comments_recursive, format_comment_html
 from dala.models import BookData, Chapter, ConversionOptions, ImageAsset, Source, normalize_url_for_matching
 
 
@@ -113,6 +119,294 @@ def test_driver_dispatch_youtube_hosts(url):
     driver = DriverDispatcher.get_driver(src)
     assert isinstance(driver, YouTubeDriver)
 
+def test_substack_metadata_reads_preloads_with_escaped_quotes():
+    payload = json.dumps({"post": {"id": 5, "title": 'say "hi")'}, "pub": {"id": 7, "subdomain": "demo"}})
+    page = f"<html><script>window._preloads = JSON.parse({json.dumps(payload)})</script></html>"
+
+    ids = SubstackDriver()._extract_all_metadata(BeautifulSoup(page, "html.parser"), page)
+
+    assert ids == ("5", "7", "demo")
+
+
+def test_substack_metadata_falls_back_to_meta_tags():
+    page = """
+    <html><head>
+      <meta name="substack:post_id" content="11">
+      <meta name="substack:publication_id" content="22">
+      <meta property="og:url" content="https://writer.substack.com/p/post">
+    </head></html>
+    """
+
+    ids = SubstackDriver()._extract_all_metadata(BeautifulSoup(page, "html.parser"), page)
+
+    assert ids == ("11", "22", "writer")
+
+
+def test_substack_ratelimit_waits_are_clamped(monkeypatch):
+    monkeypatch.setattr("dala.drivers.substack.time.time", lambda: 1_700_000_000.0)
+
+    assert _ratelimit_delay({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "1700000010"}) == 10.0
+    assert _ratelimit_delay({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "86400"}) == 60.0
+    assert _ratelimit_delay({"x-ratelimit-remaining": "50", "x-ratelimit-reset": "86400"}) == 0.0
+    assert _retry_after_delay({"Retry-After": "3"}, 0) == 3.0
+    assert _retry_after_delay({"Retry-After": "99999"}, 0) == 60.0
+
+
+def test_substack_tree_normalization_keeps_order_and_handles_deep_threads():
+    raw = [
+        {"id": 1, "name": "A", "body": "a", "date": "2024-01-01T00:00:00Z", "children": [
+            {"id": 2, "user": {"name": "B"}, "body": "b", "children": []},
+            {"id": 3, "body": "c"},
+        ]},
+        {"id": 4, "name": "D", "body": "d"},
+    ]
+    deep = current = {"id": "deep-0", "body": "x", "children": []}
+    for i in range(1, 3000):
+        child = {"id": f"deep-{i}", "body": "x", "children": []}
+        current["children"].append(child)
+        current = child
+
+    roots = SubstackDriver()._normalize_substack_tree(raw + [deep])
+
+    assert [r["id"] for r in roots] == ["1", "4", "deep-0"]
+    assert [c["id"] for c in roots[0]["children_data"]] == ["2", "3"]
+    assert [c["by"] for c in roots[0]["children_data"]] == ["B", "Anonymous"]
+    assert roots[0]["time"] == 1704067200.0
+    depth, node = 0, roots[2]
+    while node["children_data"]:
+        node = node["children_data"][0]
+        depth += 1
+    assert depth == 2999
+
+
+def test_reddit_comment_normalization_respects_order_and_max_depth():
+    def comment(cid, replies=None):
+        data = {"id": cid, "author": f"user{cid}", "body_html": f"&lt;p&gt;{cid}&lt;/p&gt;", "created_utc": 1}
+        if replies:
+            data["replies"] = {"data": {"children": replies}}
+        return {"kind": "t1", "data": data}
+
+    children = [
+        comment("a", [comment("a1", [comment("a1x")]), comment("a2")]),
+        {"kind": "more", "data": {}},
+        comment("b"),
+    ]
+
+    roots = RedditDriver()._normalize_comments(children, max_depth=2)
+
+    assert [r["id"] for r in roots] == ["a", "b"]
+    assert [c["id"] for c in roots[0]["children_data"]] == ["a1", "a2"]
+    assert roots[0]["children_data"][0]["children_data"] == []
+    assert roots[0]["by"] == "u/usera"
+    assert roots[0]["text"] == "<p>a</p>"
+
+
+@pytest.mark.asyncio
+async def test_reddit_comment_images_embed_only_image_comments(monkeypatch):
+    seen = []
+
+    async def fake_process_images(session, soup, base_url, assets, options=None):
+        seen.append(len(soup.find_all("img")))
+
+    monkeypatch.setattr(ImageProcessor, "process_images", fake_process_images)
+    roots = [
+        {"id": "a", "text": '<p><a href="https://i.example.com/cat.png">cat</a></p>', "children_data": [
+            {"id": "a1", "text": "<p>plain reply</p>", "children_data": []},
+        ]},
+        {"id": "b", "text": '<p><a href="https://commons.wikimedia.org/wiki/File:x.jpg">wiki</a></p>', "children_data": []},
+    ]
+
+    await RedditDriver()._embed_comment_images(None, roots, "https://reddit.com/r/x", [], ConversionOptions())
+
+    assert seen == [1]
+    assert roots[0]["text"] == '<p><img alt="cat" src="https://i.example.com/cat.png"/></p>'
+    assert roots[0]["children_data"][0]["text"] == "<p>plain reply</p>"
+    assert "<a " in roots[1]["text"]
+
+
+def test_forum_extract_posts_falls_back_to_message_class_substring():
+    soup = BeautifulSoup(
+        """
+        <div class="post-message" id="p1"><span class="username">alice</span><div class="messageContent">One</div></div>
+        <div class="post" id="p2"><div class="messageContent">Skipped</div></div>
+        <div class="thread-message" id="p3"><div class="messageContent">Two</div></div>
+        """,
+        "html.parser",
+    )
+
+    posts = ForumDriver()._extract_posts(soup)
+
+    assert [p["id"] for p in posts] == ["p1", "p3"]
+    assert posts[0]["author"] == "alice"
+
+
+@pytest.mark.asyncio
+async def test_cookie_session_shares_parent_connection_pool():
+    async with get_session() as parent:
+        child = session_with_cookies(parent, {"sid": "abc"})
+        assert child.connector is parent.connector
+        assert child.cookie_jar is not parent.cookie_jar
+        await child.close()
+        assert not parent.connector.closed
+
+
+@pytest.mark.parametrize(
+    ("url", "base", "page_3"),
+    [
+        ("https://f.example/threads/x.1/page-4/", "https://f.example/threads/x.1", "https://f.example/threads/x.1/page-3"),
+        ("https://f.example/index.php?threads/x.1/page-4", "https://f.example/index.php?threads/x.1", "https://f.example/index.php?threads/x.1/page-3"),
+        ("https://f.example/t?page=2&a=1", "https://f.example/t?a=1", "https://f.example/t/page-3?a=1"),
+    ],
+)
+def test_forum_page_urls_round_trip(url, base, page_3):
+    driver = ForumDriver()
+
+    assert driver._normalize_url(url) == base
+    assert driver._build_page_url(base, 1) == base
+    assert driver._build_page_url(base, 3) == page_3
+
+
+def test_forum_thread_html_points_quote_links_at_local_posts():
+    quote = (
+        '<blockquote><a class="bbCodeBlock-sourceJump" href="/goto/post?id=101" '
+        'data-xf-click="attribution" data-content-selector="#post-101">alice said:</a></blockquote><p>Reply</p>'
+    )
+    page_blocks = [(1, [
+        {"id": "post-101", "anchor_id": "post-101", "numeric_id": "101", "author": "alice", "html": "<p>Original</p>", "time": None},
+        {"id": "post-102", "anchor_id": "post-102", "numeric_id": "102", "author": "bob", "html": quote, "time": None},
+    ])]
+
+    rendered = ForumDriver()._render_thread_html("Thread", "https://f.example/threads/x.1", page_blocks)
+    link = BeautifulSoup(rendered, "html.parser").find("a", class_="bbCodeBlock-sourceJump")
+
+    assert link["href"] == "#p_post-101"
+    assert not link.has_attr("data-xf-click")
+    assert not link.has_attr("data-content-selector")
+    assert "<p>Reply</p>" in rendered
+
+
+def test_forum_thread_html_falls_back_to_parser_for_unquoted_quote_link_attrs():
+    # "it's" is an unquoted value holding a quote, which the tag regex cannot span.
+    quote = (
+        "<blockquote><a title=it's class=\"bbCodeBlock-sourceJump\" "
+        'data-content-selector="#post-101">alice said:</a></blockquote>'
+    )
+    page_blocks = [(1, [
+        {"id": "post-101", "anchor_id": "post-101", "numeric_id": "101", "author": "alice", "html": "<p>Original</p>", "time": None},
+        {"id": "post-102", "anchor_id": "post-102", "numeric_id": "102", "author": "bob", "html": quote, "time": None},
+    ])]
+
+    rendered = ForumDriver()._render_thread_html("Thread", "https://f.example/threads/x.1", page_blocks)
+    link = BeautifulSoup(rendered, "html.parser").find("a", class_="bbCodeBlock-sourceJump")
+
+    assert link["href"] == "#p_post-101"
+    assert not link.has_attr("data-content-selector")
+
+
+def test_forum_dedupe_assets_collapses_identical_content_only():
+    shared_prefix = b"\x89PNG" + b"0" * 100
+    assets = [
+        ImageAsset(uid="img_0", filename="images/a.png", media_type="image/png", content=shared_prefix + b"A", original_url=""),
+        ImageAsset(uid="img_1", filename="images/b.png", media_type="image/png", content=shared_prefix + b"B", original_url=""),
+        ImageAsset(uid="img_2", filename="images/c.png", media_type="image/png", content=shared_prefix + b"A", original_url=""),
+        ImageAsset(uid="img_3", filename="images/d.png", media_type="image/png", content=b"unique", original_url=""),
+    ]
+    html = '<img src="images/a.png"/><img src="images/b.png"/><img src="images/c.png"/><img src="images/d.png"/>'
+
+    kept, html = ForumDriver()._dedupe_assets(assets, html)
+
+    assert [a.uid for a in kept] == ["img_0", "img_1", "img_3"]
+    assert html.count("images/a.png") == 2
+    assert "images/c.png" not in html
+
+
+@pytest.mark.parametrize(
+    ("markup", "expected"),
+    [
+        ('<div class="pagination"><a href="/t?p=2"><span>Next</span></a></div>', True),
+        ('<p><a href="/t?p=3">3</a></p>', True),
+        ('<p><a href="/t?p=2">Next &gt;</a></p>', True),
+        ('<p><a href="/other"><b>next</b> article</a></p>', False),
+    ],
+)
+def test_forum_has_next_page_text_fallback(markup, expected):
+    soup = BeautifulSoup(f"<html><body>{markup}</body></html>", "html.parser")
+
+    assert ForumDriver()._has_next_page(soup, 2, "https://f.example/t") is expected
+
+
+def test_format_comment_html_highlights_pre_blocks():
+    rendered = format_comment_html({"id": "1", "text": "<p>See</p><pre>def f():\n    return 1</pre>"}, _HTML_FMT)
+    body = BeautifulSoup(rendered, "html.parser").find("div", class_="comment-body")
+
+    assert body.find("p").get_text() == "See"
+    assert body.find("div", class_="codehilite").find("pre") is not None
+    assert body.find("html") is None and body.find("body") is None
+
+
+def test_format_comment_html_nests_replies_without_recursion():
+    root = {"id": "0", "text": "<p>root</p>", "children_data": []}
+    node = root
+    for i in range(1, 3000):
+        child = {"id": str(i), "text": "<p>reply</p>", "children_data": []}
+        node["children_data"].append(child)
+        node = child
+    root["children_data"].append({"id": "sibling", "text": "<p>last</p>", "children_data": []})
+
+    rendered = format_comment_html(root, _HTML_FMT)
+
+    assert rendered.count('<div id="c_') == 3001
+    assert rendered.index('id="c_2999"') < rendered.index('id="c_sibling"')
+    assert rendered.endswith("<p>last</p></div></div></div>")
+
+
+@pytest.mark.asyncio
+async def test_hn_comment_fetch_builds_tree_in_kid_order(monkeypatch):
+    items = {
+        1: {"id": 1, "kids": [11, 12, 13], "time": 1},
+        2: {"id": 2, "dead": True, "kids": [21]},
+        11: {"id": 11, "kids": [111]},
+        12: {"id": 12, "deleted": True},
+        13: {"id": 13},
+        111: {"id": 111, "kids": [1111]},
+    }
+    requested = []
+
+    async def fake_fetch(session, url, *args, **kwargs):
+        cid = int(url.rsplit("/", 1)[-1].split(".")[0])
+        requested.append(cid)
+        await asyncio.sleep(0)
+        return items.get(cid), url
+
+    monkeypatch.setattr("dala.utils.formatting.fetch_with_retry", fake_fetch)
+
+    roots = await fetch_comments_recursive(None, [1, 2], {}, max_depth=3)
+
+    assert [r["id"] for r in roots] == ["1"]
+    assert [c["id"] for c in roots[0]["children_data"]] == ["11", "13"]
+    assert [c["id"] for c in roots[0]["children_data"][0]["children_data"]] == ["111"]
+    assert roots[0]["children_data"][0]["children_data"][0]["children_data"] == []
+    assert 21 not in requested and 1111 not in requested
+
+
+def test_enrich_comment_tree_links_navigation_ids_in_deep_threads():
+    roots = [{"id": 1, "children_data": []}, {"id": 2, "children_data": []}]
+    node = roots[0]
+    for i in range(10, 3010):
+        child = {"id": i, "children_data": []}
+        node["children_data"].append(child)
+        node = child
+    roots[0]["children_data"].append({"id": "tail", "children_data": []})
+
+    _enrich_comment_tree(roots)
+
+    first = roots[0]["children_data"][0]
+    assert roots[0]["next_root_id"] == "2"
+    assert first["parent_id"] == "1" and first["root_id"] == "1" and first["next_root_id"] == "2"
+    assert first["next_sibling_id"] == "tail"
+    assert node["parent_id"] == "3008" and node["root_id"] == "1"
+
+
 def test_is_junk_generic():
     assert BaseImageProcessor.is_junk("https://example.com/spacer.gif")
     assert not BaseImageProcessor.is_junk("https://example.com/photo.jpg")
@@ -218,6 +512,68 @@ def test_is_junk_forum():
     assert ForumImageProcessor.is_junk("https://example.com/reaction_id=5")
     assert not ForumImageProcessor.is_junk("https://example.com/attachment/123.jpg")
 
+def test_forum_viewer_page_parsing_prefers_img_then_image_link():
+    base = "https://forum.example.com/attachments/photo.123/"
+    html_with_img = b"<html><body><a href='/x'>x</a><img src='/data/photo.jpg'></body></html>"
+    html_with_link = b"<html><body><a href='/about'>About</a><a href='/full/photo.PNG?v=2'>Full</a></body></html>"
+
+    assert ForumImageProcessor._parse_viewer_for_image(html_with_img, base) == "https://forum.example.com/data/photo.jpg"
+    assert ForumImageProcessor._parse_viewer_for_image(html_with_link, base) == "https://forum.example.com/full/photo.PNG?v=2"
+    assert ForumImageProcessor._parse_viewer_for_image(b"<p>nothing</p>", base) is None
+    assert ForumImageProcessor._parse_viewer_for_image(b"", base) is None
+
+def test_forum_alt_urls_adds_query_less_variants_in_order():
+    assert ForumImageProcessor._alt_urls(
+        "https://f.example.com/a.jpg?w=1",
+        None,
+        "https://f.example.com/attachments/a.1/",
+        "https://f.example.com/a.jpg",
+        123,
+    ) == [
+        "https://f.example.com/a.jpg?w=1",
+        "https://f.example.com/a.jpg",
+        "https://f.example.com/attachments/a.1/",
+    ]
+
+def test_strip_forum_img_attrs_keeps_unlisted_attributes():
+    soup = BeautifulSoup(
+        '<img src="a.jpg" alt="Alt" id="keep" class="bbImage" data-lb-src="x" data-xf-init="lightbox" width="10">',
+        "html.parser",
+    )
+    img = soup.find("img")
+
+    ForumImageProcessor._strip_forum_img_attrs(img)
+
+    assert img.attrs == {"src": "a.jpg", "alt": "Alt", "id": "keep"}
+
+def test_asset_store_indexes_wrapped_list_in_place():
+    first = ImageAsset(
+        uid="a", filename="images/a.jpg", media_type="image/jpeg", content=b"one",
+        original_url="https://forum.example.com/attachments/a.1/?x=1",
+        alt_urls=["https://forum.example.com/attachments/a.1/"],
+    )
+    assets = [first]
+    store = AssetStore(assets)
+    second = ImageAsset(
+        uid="b", filename="images/b.jpg", media_type="image/jpeg", content=b"two",
+        original_url="https://www.forum.example.com/b.jpg",
+    )
+    store.add(second)
+
+    assert store.list is assets
+    assert assets == [first, second]
+    assert store.filename_taken("images/b.jpg")
+    assert not store.filename_taken("images/c.jpg")
+    assert store.find_by_url("http://forum.example.com/attachments/a.1") is first
+    assert store.find_by_url("https://forum.example.com/b.jpg?size=large") is second
+    assert store.find_by_url(None) is None
+    assert store.find_by_hash(AssetStore.hash_content(b"two")) is second
+
+
+def test_asset_store_uid_is_stable_per_filename():
+    assert AssetStore.uid_for("images/x.jpg") == AssetStore.uid_for("images/x.jpg")
+    assert AssetStore.uid_for("images/x.jpg") != AssetStore.uid_for("images/x_1.jpg")
+
 def test_build_meta_block_uses_compact_source_label():
     meta = ArticleExtractor.build_meta_block(
         "https://velovefamily.wordpress.com/2025/08/15/coye-la-foret-paris-coye-la-foret",
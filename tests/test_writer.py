@@ -272,6 +272,57 @@ def test_epub_nav_includes_forum_page_fragment_links(tmp_path):
     assert "thread.xhtml#page_2" in ncx
 
 
+def test_epub_writer_streams_large_images_intact(tmp_path):
+    payload = bytes(range(256)) * 10_000
+    book = BookData(
+        title="Images",
+        author="Author",
+        uid="urn:test:images",
+        language="en",
+        description="",
+        source_url="https://example.com",
+        chapters=[Chapter(title="Article", filename="index.xhtml", content_html='<p>Body</p><img src="images/big.png"/>', uid="article", is_article=True)],
+        images=[ImageAsset(uid="img_0", filename="images/big.png", media_type="image/png", content=payload, original_url="https://example.com/big.png")],
+    )
+    output = tmp_path / "images.epub"
+
+    EpubWriter.write(book, str(output))
+
+    with zipfile.ZipFile(output) as epub_file:
+        assert epub_file.namelist()[0] == "mimetype"
+        assert epub_file.getinfo("mimetype").compress_type == zipfile.ZIP_STORED
+        assert epub_file.read("EPUB/images/big.png") == payload
+        assert "Body" in epub_file.read("EPUB/index.xhtml").decode("utf-8")
+        assert epub_file.getinfo("EPUB/index.xhtml").date_time[0] > 1980
+    assert epub.read_epub(str(output)).get_item_with_href("images/big.png").get_content() == payload
+
+
+def test_epub_writer_stores_compressed_images_without_deflate(tmp_path):
+    book = BookData(
+        title="Images",
+        author="Author",
+        uid="urn:test:stored-images",
+        language="en",
+        description="",
+        source_url="https://example.com",
+        chapters=[Chapter(title="Article", filename="index.xhtml", content_html='<p>Body</p><img src="images/a.jpg"/><img src="images/b.bmp"/>', uid="article", is_article=True)],
+        images=[
+            ImageAsset(uid="img_0", filename="images/a.jpg", media_type="image/jpeg", content=b"\xff\xd8" + b"\0" * 4096, original_url=""),
+            ImageAsset(uid="img_1", filename="images/b.bmp", media_type="image/bmp", content=b"BM" + b"\0" * 4096, original_url=""),
+        ],
+    )
+    output = tmp_path / "stored.epub"
+
+    EpubWriter.write(book, str(output))
+
+    with zipfile.ZipFile(output) as epub_file:
+        assert epub_file.getinfo("EPUB/images/a.jpg").compress_type == zipfile.ZIP_STORED
+        assert epub_file.getinfo("EPUB/images/a.jpg").date_time[0] > 1980
+        assert epub_file.getinfo("EPUB/images/b.bmp").compress_type == zipfile.ZIP_DEFLATED
+        assert epub_file.getinfo("EPUB/index.xhtml").compress_type == zipfile.ZIP_DEFLATED
+        assert epub_file.read("EPUB/images/a.jpg") == b"\xff\xd8" + b"\0" * 4096
+
+
 def test_pdf_single_chapter_dedupes_document_and_chapter_titles():
     title = "Article Title"
     book = BookData(